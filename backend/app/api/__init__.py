@@ -1,4 +1,4 @@
 # API routes package
-from . import presets, comments, auth, users
+from . import presets, comments, auth, users, events
 
-__all__ = ["presets", "comments", "auth", "users"]
+__all__ = ["presets", "comments", "auth", "users", "events"]
@@ -1,8 +1,6 @@
 """认证相关 API"""
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import RedirectResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
 from app.auth import get_or_create_user_from_github, create_access_token, get_current_user
 from app.models import User
 import os
@@ -32,12 +30,11 @@ async def github_login():
 @router.get("/github/callback")
 async def github_callback(
     code: str = Query(...),
-    db: AsyncSession = Depends(get_db),
 ):
     """GitHub OAuth 回调"""
     try:
-        user = await get_or_create_user_from_github(code, db)
-        token = create_access_token(data={"sub": user.id})
+        user = await get_or_create_user_from_github(code)
+        token = create_access_token(data={"sub": str(user.id)})
         
         # 重定向到前端，携带 token
         return RedirectResponse(
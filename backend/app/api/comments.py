@@ -2,13 +2,16 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, update, delete, case
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, write_queue
 from app.models import Comment, Preset, User
 from app.auth import get_current_user, get_optional_user
+from app.broadcast import broadcaster
+from app.trending import record_activity
+from app.author_stats import author_stats
 
 router = APIRouter(prefix="/api/comments", tags=["comments"])
 
@@ -81,35 +84,46 @@ async def create_comment(
 ):
     """创建评论"""
     # 检查预设是否存在
-    preset_result = await db.execute(select(Preset).where(Preset.id == preset_id))
-    preset = preset_result.scalar_one_or_none()
-    if not preset:
+    preset_result = await db.execute(select(Preset.author_id).where(Preset.id == preset_id))
+    preset_author_id = preset_result.scalar_one_or_none()
+    if preset_author_id is None:
         raise HTTPException(status_code=404, detail="预设不存在")
     
     if not comment_data.content.strip():
         raise HTTPException(status_code=400, detail="评论内容不能为空")
     
-    # 创建评论
-    comment = Comment(
-        content=comment_data.content.strip(),
-        preset_id=preset_id,
-        author_id=current_user.id,
-    )
+    async def write(session: AsyncSession):
+        # 创建评论
+        comment = Comment(
+            content=comment_data.content.strip(),
+            preset_id=preset_id,
+            author_id=current_user.id,
+        )
+        session.add(comment)
+        count_result = await session.execute(
+            update(Preset)
+            .where(Preset.id == preset_id)
+            .values(comment_count=Preset.comment_count + 1)
+            .returning(Preset.comment_count)
+        )
+        comment_count = count_result.scalar_one()
+        await record_activity(session, preset_id, comments=1)
+        await session.flush()
+        await session.refresh(comment)
+        return comment, comment_count
     
-    db.add(comment)
-    preset.comment_count += 1
-    await db.commit()
-    await db.refresh(comment)
-    await db.refresh(comment.author)
+    comment, comment_count = await write_queue.submit(write)
+    broadcaster.publish(preset_id, comment_count=comment_count)
+    author_stats.invalidate(preset_author_id)
     
     return {
         "id": comment.id,
         "content": comment.content,
         "preset_id": comment.preset_id,
         "author": {
-            "id": comment.author.id,
-            "username": comment.author.username,
-            "avatar_url": comment.author.avatar_url,
+            "id": current_user.id,
+            "username": current_user.username,
+            "avatar_url": current_user.avatar_url,
         },
         "created_at": comment.created_at.isoformat() if comment.created_at else None,
         "updated_at": comment.updated_at.isoformat() if comment.updated_at else None,
@@ -132,14 +146,32 @@ async def delete_comment(
     if comment.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权删除")
     
-    # 减少评论计数
-    preset_result = await db.execute(select(Preset).where(Preset.id == comment.preset_id))
-    preset = preset_result.scalar_one_or_none()
-    if preset:
-        preset.comment_count = max(0, preset.comment_count - 1)
+    async def write(session: AsyncSession):
+        # 只有真正删除了评论的请求才减少计数，并发重复删除时后到的请求不再扣减
+        deleted = await session.execute(
+            delete(Comment).where(Comment.id == comment_id).returning(Comment.preset_id)
+        )
+        preset_id = deleted.scalar_one_or_none()
+        if preset_id is None:
+            return None
+        # 减少评论计数
+        count_result = await session.execute(
+            update(Preset)
+            .where(Preset.id == preset_id)
+            .values(comment_count=case((Preset.comment_count > 0, Preset.comment_count - 1), else_=0))
+            .returning(Preset.comment_count, Preset.author_id)
+        )
+        counted = count_result.one_or_none()
+        if counted is None:
+            return None
+        await record_activity(session, preset_id, comments=-1)
+        return preset_id, counted.comment_count, counted.author_id
     
-    await db.delete(comment)
-    await db.commit()
+    counted = await write_queue.submit(write)
+    if counted is not None:
+        preset_id, comment_count, preset_author_id = counted
+        broadcaster.publish(preset_id, comment_count=comment_count)
+        author_stats.invalidate(preset_author_id)
     
     return {"message": "评论删除成功"}
 
@@ -0,0 +1,88 @@
+"""实时事件 API（Server-Sent Events）"""
+import json
+import os
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import Preset
+from app.broadcast import broadcaster
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+SSE_MAX_IDS = int(os.getenv("SSE_MAX_IDS", "100"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+
+
+def _format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@router.get("/presets")
+async def preset_events(
+    ids: str = Query(..., description="逗号分隔的预设 ID"),
+):
+    """订阅预设的点赞/下载/评论计数变化
+
+    连接后先推送一次当前计数，之后每个周期推送合并后的变化：
+
+        event: counters
+        data: {"12": {"like_count": 5}, "34": {"download_count": 101}}
+    """
+    try:
+        preset_ids = {int(item) for item in ids.split(",") if item.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids 格式错误")
+    if not preset_ids:
+        raise HTTPException(status_code=400, detail="ids 不能为空")
+    if len(preset_ids) > SSE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"最多订阅 {SSE_MAX_IDS} 个预设")
+
+    # 查询均用独立会话，避免整个长连接期间占用连接
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Preset.id).where(Preset.id.in_(preset_ids), Preset.is_public == True)
+        )
+        visible_ids = list(result.scalars().all())
+    if not visible_ids:
+        raise HTTPException(status_code=404, detail="预设不存在")
+
+    async def stream():
+        # 先订阅再读取快照：快照之后提交的变化一定会推送，不会丢失；
+        # 订阅放在生成器内，客户端在开始推送前断开时也不会遗留订阅
+        subscriber = broadcaster.subscribe(visible_ids)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Preset.id, Preset.like_count, Preset.download_count, Preset.comment_count)
+                    .where(Preset.id.in_(visible_ids))
+                )
+                snapshot = {
+                    str(row.id): {
+                        "like_count": row.like_count,
+                        "download_count": row.download_count,
+                        "comment_count": row.comment_count,
+                    }
+                    for row in result
+                }
+            yield f"retry: 5000\n\n{_format_event('counters', snapshot)}"
+            while True:
+                batch = await subscriber.next_batch(SSE_HEARTBEAT)
+                if batch is None:
+                    # 心跳，保持代理连接并及时发现断开的客户端
+                    yield ": ping\n\n"
+                    continue
+                yield _format_event("counters", {str(k): v for k, v in batch.items()})
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,5 +1,7 @@
 """预设相关 API"""
+import base64
 import json
+import math
 import os
 import re
 from pathlib import Path
@@ -7,17 +9,26 @@ from typing import List, Optional
 from uuid import uuid4
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
 from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, asc
+from sqlalchemy import select, func, desc, asc, update, delete, case, tuple_
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, write_queue, dialect_insert, contains_filter
 from app.models import Preset, User, Like, Comment
 from app.auth import get_current_user, get_optional_user
 from app.preview import generate_preview_image
+from app.compression import etag_json_response
+from app.metrics import plugin_write_duration, plugin_write_failures
+from app.ratelimit import admission
+from app.broadcast import broadcaster
+from app.suggest import suggest_index
+from app.similar import similar_index
+from app.trending import record_activity
+from app.author_stats import author_stats
+from app.versions import add_initial_version, record_version, load_version, list_versions
 
 router = APIRouter(prefix="/api/presets", tags=["presets"])
 
@@ -43,12 +54,61 @@ def sanitize_slug(name: str) -> str:
     return slug[:200]
 
 
-@router.get("")
+# 列表排序列，均有 (is_public, 列) 索引，id 作为并列时的次序
+SORT_COLUMNS = {
+    "latest": Preset.created_at,
+    "popular": Preset.download_count,
+    "likes": Preset.like_count,
+    "trending": Preset.trending_score,
+}
+
+
+def _encode_cursor(value, preset_id: int) -> str:
+    """把一页最后一条的排序值与 id 编码为 next_cursor"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, preset_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# INTEGER 列的取值范围，超出时 PostgreSQL 绑定参数会报错
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _is_int32(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and INT32_MIN <= value <= INT32_MAX
+
+
+def _decode_cursor(cursor: str, sort: str):
+    """解析 next_cursor，类型与排序列不符时返回 400 而不是让数据库报错"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, preset_id = json.loads(raw)
+        if not _is_int32(preset_id):
+            raise ValueError
+        if value is None:
+            pass
+        elif sort == "latest":
+            value = datetime.fromisoformat(value)
+        elif sort == "trending":
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+                raise ValueError
+        elif not _is_int32(value):
+            raise ValueError
+        return value, preset_id
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="cursor 无效")
+
+
+# 只有带关键词的搜索（全表子串扫描）需要准入控制，前端输入已做防抖
+@router.get("", dependencies=[admission("search", when=lambda request: bool(request.query_params.get("search")))])
 async def list_presets(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    sort: str = Query("latest", regex="^(latest|popular|likes)$"),
+    sort: str = Query("latest", regex="^(latest|popular|likes|trending)$"),
     search: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，传入时按游标翻页并忽略 page"),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_user),
 ):
@@ -56,24 +116,34 @@ async def list_presets(
     query = select(Preset).where(Preset.is_public == True)
     
     if search:
-        query = query.where(Preset.name.contains(search))
-    
-    # 排序
-    if sort == "latest":
-        query = query.order_by(desc(Preset.created_at))
-    elif sort == "popular":
-        query = query.order_by(desc(Preset.download_count))
-    elif sort == "likes":
-        query = query.order_by(desc(Preset.like_count))
-    
-    # 分页
-    total_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    total = total_result.scalar()
+        query = query.where(contains_filter(Preset.name, search))
+    
+    sort_column = SORT_COLUMNS[sort]
+    
+    # 分页：带游标时从上一页最后一条之后继续（keyset），不再统计总数
+    if cursor:
+        total = None
+        value, cursor_id = _decode_cursor(cursor, sort)
+        # 以游标所指预设在库中的当前值为界，该预设已删除时退回游标中的值
+        current = select(sort_column).where(Preset.id == cursor_id).scalar_subquery()
+        query = query.where(
+            tuple_(sort_column, Preset.id) < tuple_(func.coalesce(current, value), cursor_id)
+        )
+        query = query.order_by(desc(sort_column), desc(Preset.id)).limit(page_size)
+    else:
+        total_result = await db.execute(select(func.count()).select_from(query.subquery()))
+        total = total_result.scalar()
+        query = query.order_by(desc(sort_column), desc(Preset.id))
+        query = query.offset((page - 1) * page_size).limit(page_size)
     
-    query = query.offset((page - 1) * page_size).limit(page_size)
     result = await db.execute(query.options(selectinload(Preset.author)))
     presets = result.scalars().all()
     
+    next_cursor = None
+    if len(presets) == page_size:
+        last = presets[-1]
+        next_cursor = _encode_cursor(getattr(last, sort_column.key), last.id)
+    
     # 检查用户是否已点赞
     user_liked_preset_ids = set()
     if current_user:
@@ -82,7 +152,7 @@ async def list_presets(
         )
         user_liked_preset_ids = set(likes_result.scalars().all())
     
-    return {
+    return etag_json_response(request, {
         "items": [
             {
                 "id": p.id,
@@ -106,12 +176,24 @@ async def list_presets(
         "total": total,
         "page": page,
         "page_size": page_size,
-    }
+        "next_cursor": next_cursor,
+    })
+
+
+@router.get("/suggest")
+async def suggest_presets(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(8, ge=1, le=20),
+):
+    """搜索联想（内存前缀索引，不访问数据库）"""
+    await suggest_index.wait_ready()
+    return {"items": suggest_index.search(q, limit)}
 
 
 @router.get("/{preset_id}")
 async def get_preset(
     preset_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_user),
 ):
@@ -142,7 +224,7 @@ async def get_preset(
     
     layout = json.loads(preset.layout) if isinstance(preset.layout, str) else preset.layout
     
-    return {
+    return etag_json_response(request, {
         "id": preset.id,
         "name": preset.name,
         "slug": preset.slug,
@@ -161,47 +243,57 @@ async def get_preset(
         "is_owner": current_user and preset.author_id == current_user.id,
         "created_at": preset.created_at.isoformat() if preset.created_at else None,
         "updated_at": preset.updated_at.isoformat() if preset.updated_at else None,
-    }
+    })
 
 
-@router.post("")
+@router.post("", dependencies=[admission("create_preset")])
 async def create_preset(
     preset_data: PresetCreate,
-    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """创建预设"""
-    # 生成 slug
-    base_slug = sanitize_slug(preset_data.name)
-    slug = base_slug
-    counter = 1
-    while True:
-        result = await db.execute(select(Preset).where(Preset.slug == slug))
-        if result.scalar_one_or_none() is None:
-            break
-        slug = f"{base_slug}-{counter}"
-        counter += 1
-    
-    # 创建预设
-    preset = Preset(
-        name=preset_data.name,
-        slug=slug,
-        description=preset_data.description,
-        layout=json.dumps(preset_data.layout, ensure_ascii=False),
-        author_id=current_user.id,
-        is_public=preset_data.is_public,
-    )
-    
-    # 生成预览图
+    # 生成预览图（在写队列之外完成，避免占用写连接）
+    preview_path = None
     try:
         preview_path = await generate_preview_image(preset_data.layout)
-        preset.preview_image = preview_path
     except Exception as e:
         print(f"生成预览图失败: {e}")
     
-    db.add(preset)
-    await db.commit()
-    await db.refresh(preset)
+    async def write(session: AsyncSession) -> Preset:
+        layout_json = json.dumps(preset_data.layout, ensure_ascii=False)
+        base_slug = sanitize_slug(preset_data.name)
+        slug = base_slug
+        counter = 1
+        while True:
+            # slug 已被占用（PostgreSQL 下可能刚被并发的创建占用）时不插入，换下一个
+            inserted = await session.execute(
+                dialect_insert(Preset)
+                .values(
+                    name=preset_data.name,
+                    slug=slug,
+                    description=preset_data.description,
+                    layout=layout_json,
+                    preview_image=preview_path,
+                    author_id=current_user.id,
+                    is_public=preset_data.is_public,
+                )
+                .on_conflict_do_nothing(index_elements=["slug"])
+                .returning(Preset.id)
+            )
+            preset_id = inserted.scalar_one_or_none()
+            if preset_id is not None:
+                break
+            slug = f"{base_slug}-{counter}"
+            counter += 1
+        
+        add_initial_version(session, preset_id, layout_json)
+        return await session.get(Preset, preset_id)
+    
+    preset = await write_queue.submit(write)
+    author_stats.invalidate(current_user.id)
+    if preset.is_public:
+        suggest_index.upsert(preset.id, preset.name, preset.slug, 0)
+        similar_index.upsert(preset.id, preset_data.layout)
     
     return {
         "id": preset.id,
@@ -211,7 +303,7 @@ async def create_preset(
     }
 
 
-@router.put("/{preset_id}")
+@router.put("/{preset_id}", dependencies=[admission("update_preset")])
 async def update_preset(
     preset_id: int,
     preset_data: PresetUpdate,
@@ -228,23 +320,45 @@ async def update_preset(
     if preset.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权修改")
     
+    values = {}
     if preset_data.name is not None:
-        preset.name = preset_data.name
+        values["name"] = preset_data.name
     if preset_data.description is not None:
-        preset.description = preset_data.description
+        values["description"] = preset_data.description
     if preset_data.layout is not None:
-        preset.layout = json.dumps(preset_data.layout, ensure_ascii=False)
+        values["layout"] = json.dumps(preset_data.layout, ensure_ascii=False)
         # 重新生成预览图
         try:
             preview_path = await generate_preview_image(preset_data.layout)
-            preset.preview_image = preview_path
+            values["preview_image"] = preview_path
         except Exception as e:
             print(f"生成预览图失败: {e}")
     if preset_data.is_public is not None:
-        preset.is_public = preset_data.is_public
-    
-    await db.commit()
-    await db.refresh(preset)
+        values["is_public"] = preset_data.is_public
+    
+    if values:
+        async def write(session: AsyncSession):
+            if preset_data.layout is not None:
+                # 覆盖布局前记录版本
+                await record_version(session, preset_id, preset_data.layout)
+            await session.execute(
+                update(Preset).where(Preset.id == preset_id).values(**values)
+            )
+        
+        await write_queue.submit(write)
+        
+        if "is_public" in values:
+            author_stats.invalidate(preset.author_id)
+        if "name" in values or "is_public" in values:
+            if values.get("is_public", preset.is_public):
+                suggest_index.upsert(preset_id, values.get("name", preset.name), preset.slug, preset.download_count)
+            else:
+                suggest_index.remove(preset_id)
+        if "layout" in values or "is_public" in values:
+            if values.get("is_public", preset.is_public):
+                similar_index.upsert(preset_id, values.get("layout", preset.layout))
+            else:
+                similar_index.remove(preset_id)
     
     return {"message": "预设更新成功"}
 
@@ -265,15 +379,22 @@ async def delete_preset(
     if preset.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权删除")
     
-    await db.delete(preset)
-    await db.commit()
+    # 评论、点赞由外键 ON DELETE CASCADE 在数据库内一并删除
+    async def write(session: AsyncSession):
+        await session.execute(delete(Preset).where(Preset.id == preset_id))
+    
+    await write_queue.submit(write)
+    author_stats.invalidate(preset.author_id)
+    suggest_index.remove(preset_id)
+    similar_index.remove(preset_id)
     
     return {"message": "预设删除成功"}
 
 
-@router.get("/{preset_id}/download")
+@router.get("/{preset_id}/download", dependencies=[admission("download_preset")])
 async def download_preset(
     preset_id: int,
+    version: Optional[int] = Query(None, ge=1, description="下载指定版本，默认最新"),
     db: AsyncSession = Depends(get_db),
 ):
     """下载预设"""
@@ -286,12 +407,33 @@ async def download_preset(
     if not preset.is_public:
         raise HTTPException(status_code=403, detail="预设未公开")
     
+    if version is not None:
+        layout = await load_version(db, preset, version)
+        if layout is None:
+            raise HTTPException(status_code=404, detail="版本不存在")
+    else:
+        layout = json.loads(preset.layout) if isinstance(preset.layout, str) else preset.layout
+    
     # 增加下载计数
-    preset.download_count += 1
-    await db.commit()
+    async def write(session: AsyncSession) -> Optional[int]:
+        result = await session.execute(
+            update(Preset)
+            .where(Preset.id == preset_id)
+            .values(download_count=Preset.download_count + 1)
+            .returning(Preset.download_count)
+        )
+        download_count = result.scalar_one_or_none()
+        if download_count is not None:
+            await record_activity(session, preset_id, downloads=1)
+        return download_count
+    
+    download_count = await write_queue.submit(write)
+    if download_count is not None:
+        broadcaster.publish(preset_id, download_count=download_count)
+        suggest_index.set_download_count(preset_id, download_count)
+        author_stats.invalidate(preset.author_id)
     
     # 构建预设 JSON
-    layout = json.loads(preset.layout) if isinstance(preset.layout, str) else preset.layout
     preset_json = {
         "name": preset.name,
         "slug": preset.slug,
@@ -304,12 +446,13 @@ async def download_preset(
     if plugin_data_dir:
         preset_dir = Path(plugin_data_dir) / "presets"
         try:
-            preset_dir.mkdir(parents=True, exist_ok=True)
-            preset_file = preset_dir / f"{preset.slug}.json"
-            preset_file.write_text(
-                json.dumps(preset_json, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
+            with plugin_write_duration.time():
+                preset_dir.mkdir(parents=True, exist_ok=True)
+                preset_file = preset_dir / f"{preset.slug}.json"
+                preset_file.write_text(
+                    json.dumps(preset_json, ensure_ascii=False, indent=2),
+                    encoding="utf-8"
+                )
             return JSONResponse({
                 "message": "预设已保存到插件目录",
                 "path": str(preset_file),
@@ -317,9 +460,11 @@ async def download_preset(
             })
         except PermissionError as e:
             # 权限错误
+            plugin_write_failures.inc()
             print(f"保存到插件目录失败（权限错误）: {e}")
         except Exception as e:
             # 其他错误
+            plugin_write_failures.inc()
             print(f"保存到插件目录失败: {e}")
     
     # 否则返回 JSON 文件下载
@@ -335,36 +480,150 @@ async def download_preset(
 @router.post("/{preset_id}/like")
 async def toggle_like(
     preset_id: int,
-    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """点赞/取消点赞"""
+    async def write(session: AsyncSession):
+        result = await session.execute(select(Preset.id).where(Preset.id == preset_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="预设不存在")
+        
+        # 点赞：唯一索引冲突说明已点赞，改为取消点赞
+        inserted = await session.execute(
+            dialect_insert(Like)
+            .values(preset_id=preset_id, user_id=current_user.id)
+            .on_conflict_do_nothing(index_elements=["preset_id", "user_id"])
+            .returning(Like.id)
+        )
+        liked = inserted.scalar_one_or_none() is not None
+        
+        if liked:
+            new_count = Preset.like_count + 1
+        else:
+            # 取消点赞
+            await session.execute(
+                delete(Like).where(
+                    Like.preset_id == preset_id,
+                    Like.user_id == current_user.id
+                )
+            )
+            new_count = case((Preset.like_count > 0, Preset.like_count - 1), else_=0)
+        
+        count_result = await session.execute(
+            update(Preset)
+            .where(Preset.id == preset_id)
+            .values(like_count=new_count)
+            .returning(Preset.like_count, Preset.author_id)
+        )
+        await record_activity(session, preset_id, likes=1 if liked else -1)
+        like_count, author_id = count_result.one()
+        return liked, like_count, author_id
+    
+    liked, like_count, author_id = await write_queue.submit(write)
+    broadcaster.publish(preset_id, like_count=like_count)
+    author_stats.invalidate(author_id)
+    return {"liked": liked, "like_count": like_count}
+
+
+async def _get_visible_preset(db: AsyncSession, preset_id: int, current_user: Optional[User]) -> Preset:
+    """读取预设，未公开的预设只有作者可见"""
     result = await db.execute(select(Preset).where(Preset.id == preset_id))
     preset = result.scalar_one_or_none()
     
     if not preset:
         raise HTTPException(status_code=404, detail="预设不存在")
     
-    # 检查是否已点赞
-    like_result = await db.execute(
-        select(Like).where(
-            Like.preset_id == preset_id,
-            Like.user_id == current_user.id
+    if not preset.is_public and (not current_user or preset.author_id != current_user.id):
+        raise HTTPException(status_code=403, detail="无权访问")
+    
+    return preset
+
+
+@router.get("/{preset_id}/similar")
+async def get_similar_presets(
+    preset_id: int,
+    limit: int = Query(6, ge=1, le=20),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+):
+    """按布局特征推荐相似的公开预设"""
+    preset = await _get_visible_preset(db, preset_id, current_user)
+    
+    await similar_index.wait_ready()
+    neighbours = similar_index.nearest(
+        similar_index.vector(preset_id, preset.layout), limit, exclude=preset_id
+    )
+    if not neighbours:
+        return {"items": []}
+    
+    result = await db.execute(
+        select(
+            Preset.id, Preset.name, Preset.slug, Preset.preview_image,
+            Preset.download_count, Preset.like_count,
         )
+        .where(Preset.id.in_([i for i, _ in neighbours]), Preset.is_public == True)
     )
-    like = like_result.scalar_one_or_none()
-    
-    if like:
-        # 取消点赞
-        await db.delete(like)
-        preset.like_count = max(0, preset.like_count - 1)
-        await db.commit()
-        return {"liked": False, "like_count": preset.like_count}
-    else:
-        # 点赞
-        like = Like(preset_id=preset_id, user_id=current_user.id)
-        db.add(like)
-        preset.like_count += 1
-        await db.commit()
-        return {"liked": True, "like_count": preset.like_count}
+    rows = {row.id: row for row in result}
+    
+    return {
+        "items": [
+            {
+                "id": neighbour_id,
+                "name": rows[neighbour_id].name,
+                "slug": rows[neighbour_id].slug,
+                "preview_image": rows[neighbour_id].preview_image,
+                "download_count": rows[neighbour_id].download_count,
+                "like_count": rows[neighbour_id].like_count,
+                "distance": round(distance, 4),
+            }
+            for neighbour_id, distance in neighbours
+            if neighbour_id in rows
+        ]
+    }
+
+
+@router.get("/{preset_id}/versions")
+async def get_preset_versions(
+    preset_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+):
+    """获取预设的版本列表"""
+    preset = await _get_visible_preset(db, preset_id, current_user)
+    
+    items = await list_versions(db, preset_id)
+    if not items:
+        # 没有历史记录的旧预设只有当前版本
+        items = [{
+            "version": 1,
+            "is_snapshot": True,
+            "size": len(preset.layout),
+            "created_at": preset.created_at.isoformat() if preset.created_at else None,
+        }]
+    
+    return {
+        "preset_id": preset_id,
+        "current_version": items[0]["version"],
+        "items": items,
+    }
 
+
+@router.get("/{preset_id}/versions/{version}")
+async def get_preset_version(
+    preset_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_user),
+):
+    """获取指定版本的布局"""
+    preset = await _get_visible_preset(db, preset_id, current_user)
+    
+    layout = await load_version(db, preset, version)
+    if layout is None:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    
+    return {
+        "preset_id": preset_id,
+        "version": version,
+        "layout": layout,
+    }
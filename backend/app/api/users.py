@@ -1,26 +1,36 @@
 """用户相关 API"""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, desc
+from sqlalchemy.orm import defer
 
 from app.database import get_db
 from app.models import User, Preset
 from app.auth import get_current_user
+from app.author_stats import author_stats
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 
-@router.get("/me/presets")
-async def get_my_presets(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    """获取当前用户的预设列表"""
+async def _author_presets(
+    db: AsyncSession,
+    author_id: int,
+    include_private: bool,
+    page: int,
+    page_size: int,
+) -> dict:
+    """作者的预设列表，按创建时间倒序分页，不加载布局"""
+    query = select(Preset).where(Preset.author_id == author_id)
+    if not include_private:
+        query = query.where(Preset.is_public == True)
+    # 总数复用统计缓存，不再单独 COUNT
+    total = (await author_stats.get(db, author_id, include_private))["preset_count"]
+    
     result = await db.execute(
-        select(Preset)
-        .where(Preset.author_id == current_user.id)
-        .options(selectinload(Preset.author))
+        query.options(defer(Preset.layout))
+        .order_by(desc(Preset.created_at), desc(Preset.id))
+        .offset((page - 1) * page_size)
+        .limit(page_size)
     )
     presets = result.scalars().all()
     
@@ -39,6 +49,74 @@ async def get_my_presets(
                 "created_at": p.created_at.isoformat() if p.created_at else None,
             }
             for p in presets
-        ]
+        ],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
     }
 
+
+async def _get_author(db: AsyncSession, user_id: int) -> User:
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    return user
+
+
+@router.get("/me/presets")
+async def get_my_presets(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """获取当前用户的预设列表（包含未公开的预设）"""
+    return await _author_presets(db, current_user.id, True, page, page_size)
+
+
+@router.get("/me/stats")
+async def get_my_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """当前用户全部预设的下载、点赞、评论总数"""
+    return await author_stats.get(db, current_user.id, include_private=True)
+
+
+@router.get("/{user_id}")
+async def get_user_profile(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """作者公开主页：基本信息与公开预设的统计"""
+    user = await _get_author(db, user_id)
+    return {
+        "id": user.id,
+        "username": user.username,
+        "avatar_url": user.avatar_url,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "stats": await author_stats.get(db, user_id, include_private=False),
+    }
+
+
+@router.get("/{user_id}/presets")
+async def get_user_presets(
+    user_id: int,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """作者的公开预设列表"""
+    await _get_author(db, user_id)
+    return await _author_presets(db, user_id, False, page, page_size)
+
+
+@router.get("/{user_id}/stats")
+async def get_user_stats(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """作者公开预设的下载、点赞、评论总数"""
+    await _get_author(db, user_id)
+    return await author_stats.get(db, user_id, include_private=False)
@@ -2,14 +2,12 @@
 import os
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.database import get_db
+from app.database import get_db, write_queue
 from app.models import User
-import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,6 +22,8 @@ security = HTTPBearer()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """创建 JWT token"""
+    from jose import jwt
+    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -36,6 +36,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def decode_access_token(token: str) -> Optional[dict]:
     """解码 JWT token"""
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
         return payload
@@ -56,8 +58,10 @@ async def get_current_user(
             detail="无效的认证令牌",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user_id: int = payload.get("sub")
-    if user_id is None:
+    # sub 按 JWT 规范为字符串，转为整数后再查询（asyncpg 不会隐式转换参数类型）
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的认证令牌",
@@ -86,8 +90,11 @@ async def get_optional_user(
         return None
 
 
-async def get_or_create_user_from_github(github_code: str, db: AsyncSession) -> User:
+async def get_or_create_user_from_github(github_code: str) -> User:
     """通过 GitHub OAuth code 获取或创建用户"""
+    # httpx 仅在 OAuth 登录时使用，按需导入
+    import httpx
+    
     # 1. 用 code 换取 access_token
     async with httpx.AsyncClient() as client:
         token_response = await client.post(
@@ -119,27 +126,26 @@ async def get_or_create_user_from_github(github_code: str, db: AsyncSession) ->
         email = github_user.get("email")
 
     # 3. 查找或创建用户
-    result = await db.execute(select(User).where(User.github_id == github_id))
-    user = result.scalar_one_or_none()
-    
-    if user is None:
-        user = User(
-            github_id=github_id,
-            username=username,
-            avatar_url=avatar_url,
-            email=email,
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    else:
-        # 更新用户信息
-        user.username = username
-        user.avatar_url = avatar_url
-        if email:
-            user.email = email
-        await db.commit()
-        await db.refresh(user)
+    async def write(session: AsyncSession) -> User:
+        result = await session.execute(select(User).where(User.github_id == github_id))
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            user = User(
+                github_id=github_id,
+                username=username,
+                avatar_url=avatar_url,
+                email=email,
+            )
+            session.add(user)
+        else:
+            # 更新用户信息
+            user.username = username
+            user.avatar_url = avatar_url
+            if email:
+                user.email = email
+        await session.flush()
+        return user
     
-    return user
+    return await write_queue.submit(write)
 
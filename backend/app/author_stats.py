@@ -0,0 +1,72 @@
+"""作者统计：预设数与下载、点赞、评论总数
+
+一次聚合查询算出全部总数，结果缓存在进程内；作者的预设发生增删改或计数变化时失效，
+AUTHOR_STATS_TTL 作为多进程部署下的兜底过期时间。
+"""
+import os
+import time
+from typing import Dict, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Preset
+
+load_dotenv()
+
+AUTHOR_STATS_TTL = float(os.getenv("AUTHOR_STATS_TTL", "300"))
+AUTHOR_STATS_MAX_ENTRIES = 10000
+
+
+async def query_author_stats(db: AsyncSession, author_id: int, include_private: bool) -> dict:
+    """单条聚合查询统计作者的预设"""
+    query = select(
+        func.count(Preset.id),
+        func.coalesce(func.sum(Preset.download_count), 0),
+        func.coalesce(func.sum(Preset.like_count), 0),
+        func.coalesce(func.sum(Preset.comment_count), 0),
+    ).where(Preset.author_id == author_id)
+    if not include_private:
+        query = query.where(Preset.is_public == True)
+    presets, downloads, likes, comments = (await db.execute(query)).one()
+    return {
+        "preset_count": presets,
+        "total_downloads": downloads,
+        "total_likes": likes,
+        "total_comments": comments,
+    }
+
+
+class AuthorStatsCache:
+    """按 (作者, 是否包含未公开预设) 缓存统计结果"""
+
+    def __init__(self, ttl: float = AUTHOR_STATS_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[int, bool], Tuple[float, dict]] = {}
+        # 每个作者的失效次数，查询期间发生失效时不写入缓存
+        self._generations: Dict[int, int] = {}
+
+    async def get(self, db: AsyncSession, author_id: int, include_private: bool) -> dict:
+        key = (author_id, include_private)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        generation = self._generations.get(author_id, 0)
+        stats = await query_author_stats(db, author_id, include_private)
+        if self._generations.get(author_id, 0) == generation:
+            if len(self._entries) >= AUTHOR_STATS_MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, stats)
+        return stats
+
+    def invalidate(self, author_id: int):
+        """作者的预设或计数变化后调用"""
+        self._entries.pop((author_id, True), None)
+        self._entries.pop((author_id, False), None)
+        self._generations[author_id] = self._generations.get(author_id, 0) + 1
+
+
+author_stats = AuthorStatsCache()
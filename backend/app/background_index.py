@@ -0,0 +1,58 @@
+"""后台构建的内存索引基类
+
+启动时在后台任务中从数据库构建快照，不推迟服务就绪。构建期间收到的增量更新先排队，
+快照装入后按顺序重放，构建开始之后提交的修改不会被快照覆盖。子类实现：
+
+- _build_snapshot()：读取数据库并完成耗时的计算，返回快照
+- _apply(snapshot)：把快照装入索引（同步执行，与重放之间不会插入其他更新）
+
+增量更新方法开头调用 self._defer(方法, *参数)，返回 True 时直接返回。
+"""
+import asyncio
+from typing import Any, Optional
+
+
+class BackgroundIndex:
+    """后台构建、构建期间排队增量更新的索引"""
+
+    # 日志中使用的索引名称
+    name = "索引"
+
+    def __init__(self):
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # 构建期间收到的增量更新，构建完成后按顺序重放
+        self._pending: Optional[list] = None
+
+    def start(self):
+        """在后台构建索引（只执行一次）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._build())
+
+    async def wait_ready(self):
+        self.start()
+        await self._ready.wait()
+
+    async def _build(self):
+        self._pending = []
+        try:
+            self._apply(await self._build_snapshot())
+        except Exception as e:
+            print(f"构建{self.name}失败: {e}")
+        finally:
+            pending, self._pending = self._pending, None
+            for method, args in pending:
+                method(*args)
+            self._ready.set()
+
+    async def _build_snapshot(self) -> Any:
+        raise NotImplementedError
+
+    def _apply(self, snapshot: Any):
+        raise NotImplementedError
+
+    def _defer(self, method, *args) -> bool:
+        if self._pending is not None:
+            self._pending.append((method, args))
+            return True
+        return False
@@ -0,0 +1,109 @@
+"""进程内计数器广播
+
+写操作提交后调用 broadcaster.publish(preset_id, like_count=...)，更新先合并到待发送表，
+由后台任务每隔 BROADCAST_INTERVAL 秒批量分发给订阅了对应预设的连接；
+同一预设在一个周期内的多次变化只发送最新值。
+
+未被任何连接订阅的预设直接丢弃更新；空闲订阅者只持有 ID 集合与一个待发送字典。
+"""
+import asyncio
+import os
+from typing import Dict, Iterable, Optional, Set
+
+from dotenv import load_dotenv
+
+from app.metrics import sse_subscribers, sse_updates_flushed
+
+load_dotenv()
+
+BROADCAST_INTERVAL = float(os.getenv("BROADCAST_INTERVAL", "1.0"))
+
+Counters = Dict[str, int]
+
+
+class Subscriber:
+    """一个 SSE 连接"""
+    __slots__ = ("ids", "pending", "waiter")
+
+    def __init__(self, ids: Iterable[int]):
+        self.ids = frozenset(ids)
+        # preset_id -> 变化的计数字段，取走后重置为 None
+        self.pending: Optional[Dict[int, Counters]] = None
+        self.waiter: Optional[asyncio.Future] = None
+
+    def _deliver(self, preset_id: int, counters: Counters):
+        if self.pending is None:
+            self.pending = {}
+        self.pending.setdefault(preset_id, {}).update(counters)
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_batch(self, timeout: float) -> Optional[Dict[int, Counters]]:
+        """等待下一批更新，超时返回 None（用于发送心跳）"""
+        if self.pending is None:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self.waiter = None
+        batch, self.pending = self.pending, None
+        return batch
+
+
+class Broadcaster:
+    """按预设 ID 索引订阅者，合并更新后定期批量分发"""
+
+    def __init__(self, interval: float = BROADCAST_INTERVAL):
+        self.interval = interval
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._pending: Dict[int, Counters] = {}
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, ids: Iterable[int]) -> Subscriber:
+        subscriber = Subscriber(ids)
+        for preset_id in subscriber.ids:
+            self._subscribers.setdefault(preset_id, set()).add(subscriber)
+        self._count += 1
+        sse_subscribers.inc()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for preset_id in subscriber.ids:
+            watchers = self._subscribers.get(preset_id)
+            if watchers is None:
+                continue
+            watchers.discard(subscriber)
+            if not watchers:
+                del self._subscribers[preset_id]
+                self._pending.pop(preset_id, None)
+        self._count -= 1
+        sse_subscribers.dec()
+
+    def publish(self, preset_id: int, **counters: int):
+        """记录计数变化；无人订阅时直接忽略"""
+        if preset_id in self._subscribers:
+            self._pending.setdefault(preset_id, {}).update(counters)
+
+    def flush(self):
+        """把本周期合并后的更新分发给订阅者"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for preset_id, counters in pending.items():
+            for subscriber in self._subscribers.get(preset_id, ()):
+                subscriber._deliver(preset_id, counters)
+            sse_updates_flushed.inc()
+
+    async def _flush_loop(self):
+        # 没有订阅者时退出，下次订阅再启动
+        while self._count > 0:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+
+broadcaster = Broadcaster()
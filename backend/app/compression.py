@@ -0,0 +1,233 @@
+"""API 响应压缩中间件"""
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时仅使用 gzip
+    brotli = None
+
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "512"))
+
+# 只压缩文本类响应，图片等已压缩的内容直接透传
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/plain",
+    "text/html",
+    "text/css",
+    "application/javascript",
+)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 编码 -> q 值"""
+    encodings = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """根据客户端声明选择编码，优先 br"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """按指定编码压缩"""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """按 (ETag, 编码) 缓存压缩结果的 LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        key = (etag, encoding)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, etag: str, encoding: str, data: bytes):
+        if self.max_entries <= 0:
+            return
+        key = (etag, encoding)
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+compressed_cache = CompressedCache(COMPRESSION_CACHE_SIZE)
+
+
+class CompressionMiddleware:
+    """协商 Accept-Encoding 并压缩大于阈值的文本响应
+
+    带 ETag 的响应（缓存过的列表页、布局详情等）按 ETag 复用压缩结果，
+    命中时不再重复消耗压缩 CPU。流式响应（如 SSE、静态文件）直接透传。
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, cache: CompressedCache = compressed_cache):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+        await responder.finish()
+
+
+class _CompressionResponder:
+    """缓冲单块响应体，决定是否压缩后再发送"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.start_message is None:
+            await self.send(message)
+            return
+
+        start = self.start_message
+        self.start_message = None
+        body = message.get("body", b"")
+        # 流式响应不缓冲，直接透传
+        if message.get("more_body", False) or not self._should_compress(start, body):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        compressed = self._compress(start, body)
+        headers = [
+            (k, v) for k, v in start["headers"]
+            if k not in (b"content-length", b"vary")
+        ]
+        vary = [v for k, v in start["headers"] if k == b"vary"]
+        vary_value = b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+        headers.append((b"vary", vary_value))
+        await self.send({**start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": compressed})
+
+    async def finish(self):
+        # 应用没有发送响应体（异常等情况），补发已缓存的响应头
+        if self.start_message is not None:
+            await self.send(self.start_message)
+            self.start_message = None
+
+    def _should_compress(self, start, body: bytes) -> bool:
+        if len(body) < self.middleware.minimum_size:
+            return False
+        content_type = b""
+        for name, value in start["headers"]:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").split(";")[0].strip() in COMPRESSIBLE_TYPES
+
+    def _compress(self, start, body: bytes) -> bytes:
+        etag = _header(start["headers"], b"etag")
+        if etag is None:
+            return compress(body, self.encoding)
+        cached = self.middleware.cache.get(etag, self.encoding)
+        if cached is None:
+            cached = compress(body, self.encoding)
+            self.middleware.cache.put(etag, self.encoding, cached)
+        return cached
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def etag_json_response(request: Request, content) -> Response:
+    """序列化 JSON 并附带内容哈希 ETag，客户端缓存命中时返回 304
+
+    ETag 同时作为压缩缓存的键，相同内容只压缩一次。
+    """
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
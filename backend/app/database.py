@@ -1,32 +1,273 @@
 """数据库配置和会话管理"""
+import asyncio
+import contextvars
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 
+from app.metrics import db_pool_wait, instrument_engine
+from app.query_budget import track_engine
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./preset_market.db")
+# 兼容 postgres:// 形式的连接串，统一使用 asyncpg 驱动
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    DATABASE_URL = "postgresql+asyncpg://" + DATABASE_URL.split("://", 1)[1]
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_POSTGRES = DATABASE_URL.startswith("postgresql")
+IS_SQLITE_MEMORY = IS_SQLITE and (DATABASE_URL.endswith(":memory:") or DATABASE_URL.rstrip("/").endswith(":"))
+
+# SQLite 生产配置：WAL + 调优 pragma + 读连接池 / 单写连接分离
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # 毫秒
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))  # 负数单位为 KiB
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "5"))
+
+USE_SQLITE_PROFILE = IS_SQLITE and SQLITE_PROFILE and not IS_SQLITE_MEMORY
+
+# SQLite 数据库必须位于的目录（docker-compose 设为挂载的 /app/data），
+# 数据库文件落在容器层时重建容器会丢失全部数据，启动时直接报错
+SQLITE_DATA_DIR = os.getenv("SQLITE_DATA_DIR", "")
+
+# PostgreSQL 连接池与语句缓存
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+if USE_SQLITE_PROFILE:
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+    )
+    # 全部写事务共用一条连接，由 write_queue 串行投递
+    write_engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+elif IS_POSTGRES:
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    )
+    write_engine = engine
+else:
+    engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+    write_engine = engine
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """新连接建立时应用 SQLite pragma"""
+    cursor = dbapi_connection.cursor()
+    # 外键约束（含 ON DELETE CASCADE）在 SQLite 中需按连接开启
+    cursor.execute("PRAGMA foreign_keys=ON")
+    if USE_SQLITE_PROFILE:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    if write_engine is not engine:
+        event.listen(write_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+instrument_engine(engine, "main")
+track_engine(engine)
+if write_engine is not engine:
+    instrument_engine(write_engine, "writer")
+    track_engine(write_engine)
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+WriteSessionLocal = async_sessionmaker(
+    write_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 Base = declarative_base()
 
+T = TypeVar("T")
+
+# 当前请求通过 get_db 取得的读会话，排队等待写任务前释放其连接
+_request_session: contextvars.ContextVar[Optional[AsyncSession]] = contextvars.ContextVar(
+    "request_session", default=None
+)
+
+
+async def release_read_session():
+    """把当前请求的读连接归还连接池
+
+    已加载的对象保持可读（expire_on_commit=False，关闭会话不会使其过期），
+    之后再用该会话查询会重新取连接，并能读到刚提交的写入。
+    """
+    session = _request_session.get()
+    if session is not None and session.in_transaction():
+        await session.close()
+
+
+class WriteQueue:
+    """异步写队列
+
+    SQLite 下所有写事务排队，在唯一的写连接上逐个执行并提交，
+    读请求走独立连接池，不会因写锁出现 "database is locked"。
+    其他数据库直接在新会话中执行，不做串行化。
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, serialized: bool):
+        self.session_factory = session_factory
+        self.serialized = serialized
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, fn: Callable[..., Awaitable[T]], *args: Any) -> T:
+        """提交写任务，fn(session, *args) 执行完毕后自动提交，返回其结果"""
+        if not self.serialized:
+            return await self._run(fn, args)
+        # 排队期间不占用读连接，否则写入高峰会耗尽读连接池，读请求随之排队
+        await release_read_session()
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        # 带上提交方的上下文，写任务中的查询计入对应请求的统计
+        await self._queue.put((fn, args, future, contextvars.copy_context()))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # 写协程本身不继承任何请求的上下文
+            self._worker = contextvars.Context().run(loop.create_task, self._work())
+
+    async def _run(self, fn, args):
+        async with self.session_factory() as session:
+            try:
+                with db_pool_wait.time("writer" if self.serialized else "main"):
+                    await session.connection()
+                result = await fn(session, *args)
+                await session.commit()
+                return result
+            except BaseException:
+                await session.rollback()
+                raise
+
+    async def _work(self):
+        while True:
+            fn, args, future, context = await self._queue.get()
+            if future.cancelled():
+                continue
+            try:
+                result = await context.run(asyncio.ensure_future, self._run(fn, args))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        """停止写任务协程"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        self._queue = None
+
+
+write_queue = WriteQueue(WriteSessionLocal, serialized=USE_SQLITE_PROFILE)
+
+
+def dialect_insert(model):
+    """返回当前数据库方言的 INSERT 构造，支持 ON CONFLICT"""
+    if IS_POSTGRES:
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def contains_filter(column, term: str):
+    """子串搜索条件，PostgreSQL 下使用可命中 pg_trgm 索引的 ILIKE"""
+    if IS_POSTGRES:
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return column.ilike(f"%{escaped}%", escape="\\")
+    return column.contains(term, autoescape=True)
+
 
 async def get_db():
     """获取数据库会话"""
     async with AsyncSessionLocal() as session:
+        # 每个请求运行在独立的上下文中，无需在结束时重置
+        _request_session.set(session)
         try:
+            with db_pool_wait.time("main"):
+                await session.connection()
             yield session
         finally:
             await session.close()
 
 
+def check_sqlite_location():
+    """设置了 SQLITE_DATA_DIR 而 SQLite 数据库不在该目录内时拒绝启动"""
+    if not IS_SQLITE or IS_SQLITE_MEMORY or not SQLITE_DATA_DIR:
+        return
+    database = Path(make_url(DATABASE_URL).database).resolve()
+    data_dir = Path(SQLITE_DATA_DIR).resolve()
+    if not database.is_relative_to(data_dir):
+        raise RuntimeError(
+            f"SQLite 数据库 {database} 不在挂载的数据目录 {data_dir} 中，重建容器后数据会丢失。"
+            f"请将 .env 中的 DATABASE_URL 改为 sqlite+aiosqlite:///{data_dir}/preset_market.db，"
+            "从旧版本升级的迁移步骤见 README「更新服务」"
+        )
+
+
 async def init_db():
-    """初始化数据库表"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """初始化数据库：执行未应用的 schema 迁移"""
+    from app.migrations import run_migrations
+    
+    check_sqlite_location()
+    await run_migrations(write_engine)
+
 
+async def close_db():
+    """关闭写队列并释放连接池"""
+    await write_queue.close()
+    if USE_SQLITE_PROFILE:
+        # 将 WAL 内容写回主库文件，仅挂载 .db 文件的部署重启后不丢数据
+        async with write_engine.connect() as conn:
+            await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    await engine.dispose()
+    if write_engine is not engine:
+        await write_engine.dispose()
@@ -0,0 +1,109 @@
+"""最小化的 JSON Patch（RFC 6902）实现
+
+只生成和应用 add / remove / replace 三种操作，足以表示布局 JSON 的修改：
+对象按键递归比较；数组先去掉相同的首尾元素，中间部分逐项递归，多出的元素整体增删，
+因此插入或删除单个图层只产生一条操作。
+"""
+from typing import Any, List
+
+Patch = List[dict]
+
+
+def _escape(token) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def json_equal(a: Any, b: Any) -> bool:
+    """按 JSON 语义比较：Python 中 1 == 1.0 == True，而在 JSON 中三者是不同的值"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(json_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def make_patch(old: Any, new: Any) -> Patch:
+    """生成把 old 变为 new 的补丁"""
+    ops: Patch = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: Patch):
+    if type(old) is not type(new):
+        ops.append({"op": "replace", "path": path, "value": new})
+    elif isinstance(old, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            elif not json_equal(old[key], value):
+                _diff(old[key], value, f"{path}/{_escape(key)}", ops)
+    elif isinstance(old, list):
+        _diff_list(old, new, path, ops)
+    elif old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def _diff_list(old: list, new: list, path: str, ops: Patch):
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and json_equal(old[prefix], new[prefix]):
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and json_equal(old[-1 - suffix], new[-1 - suffix]):
+        suffix += 1
+
+    old_middle = old[prefix:len(old) - suffix]
+    new_middle = new[prefix:len(new) - suffix]
+    common = min(len(old_middle), len(new_middle))
+    for i in range(common):
+        if not json_equal(old_middle[i], new_middle[i]):
+            _diff(old_middle[i], new_middle[i], f"{path}/{prefix + i}", ops)
+    # 从后往前删除，避免下标移动
+    for i in range(len(old_middle) - 1, common - 1, -1):
+        ops.append({"op": "remove", "path": f"{path}/{prefix + i}"})
+    for i in range(common, len(new_middle)):
+        ops.append({"op": "add", "path": f"{path}/{prefix + i}", "value": new_middle[i]})
+
+
+def apply_patch(document: Any, patch: Patch) -> Any:
+    """把补丁应用到 document 上（原地修改），返回结果文档"""
+    for op in patch:
+        path = op["path"]
+        if path == "":
+            # 整个文档被替换
+            document = op["value"]
+            continue
+        tokens = [_unescape(token) for token in path.split("/")[1:]]
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        kind = op["op"]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if kind == "add":
+                parent.insert(index, op["value"])
+            elif kind == "remove":
+                del parent[index]
+            elif kind == "replace":
+                parent[index] = op["value"]
+            else:
+                raise ValueError(f"不支持的补丁操作: {kind}")
+        else:
+            if kind in ("add", "replace"):
+                parent[last] = op["value"]
+            elif kind == "remove":
+                del parent[last]
+            else:
+                raise ValueError(f"不支持的补丁操作: {kind}")
+    return document
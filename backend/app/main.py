@@ -3,11 +3,18 @@ import os
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 
-from app.database import init_db
-from app.api import presets, comments, auth, users
+from app.database import init_db, close_db
+from app.compression import CompressionMiddleware, COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE
+from app.metrics import MetricsMiddleware, render_metrics
+from app.query_budget import QueryBudgetMiddleware
+from app.suggest import suggest_index
+from app.similar import similar_index
+from app.trending import trending_updater
+from app.api import presets, comments, auth, users, events
 
 load_dotenv()
 
@@ -27,6 +34,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩（gzip / brotli）
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# 请求级查询统计（DEBUG 模式输出 Server-Timing）
+app.add_middleware(QueryBudgetMiddleware)
+
+# 请求指标（最外层，耗时包含压缩等中间件）
+app.add_middleware(MetricsMiddleware)
+
 # 静态文件服务
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -37,12 +54,18 @@ app.include_router(auth.router)
 app.include_router(presets.router)
 app.include_router(comments.router)
 app.include_router(users.router)
+app.include_router(events.router)
 
 
 @app.on_event("startup")
 async def startup_event():
     """启动时初始化数据库"""
     await init_db()
+    # 搜索联想与相似推荐索引在后台构建，不推迟服务就绪
+    suggest_index.start()
+    similar_index.start()
+    # 定期重算热门分数
+    trending_updater.start()
     print("=" * 50)
     print("✅ 数据库初始化完成")
     print(f"📁 上传目录: {UPLOAD_DIR.absolute()}")
@@ -54,6 +77,13 @@ async def startup_event():
     print("=" * 50)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """关闭时释放数据库连接"""
+    await trending_updater.stop()
+    await close_db()
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -68,3 +98,9 @@ async def health():
     """健康检查"""
     return {"status": "ok"}
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
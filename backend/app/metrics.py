@@ -0,0 +1,335 @@
+"""运行指标采集（Prometheus 文本格式）
+
+进程内轻量实现：计数器、仪表和直方图都是普通的字典操作，
+请求路径上只有几次 perf_counter 与 bisect，可在生产环境常开。
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """只增计数器"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        if not self._values and not self.labelnames:
+            return [f"{self.name} 0"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """分桶直方图（秒）"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各桶计数..., 总和, 总数]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            data[index] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        """上下文管理器：记录代码块耗时"""
+        return _Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        data = self._values.get(labels)
+        return int(data[-1]) if data else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, data in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, data):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {_format_value(cumulative)}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {_format_value(data[-1])}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(data[-1])}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时", ("method", "route")
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "正在处理的 HTTP 请求数"
+)
+
+# 数据库
+db_queries_total = registry.counter(
+    "db_queries_total", "SQL 语句执行次数", ("engine", "operation")
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "SQL 语句执行耗时", ("engine", "operation")
+)
+db_pool_wait = registry.histogram(
+    "db_pool_wait_seconds", "从连接池获取连接的等待时间", ("engine",)
+)
+
+# 预览图与插件目录
+preview_render_duration = registry.histogram(
+    "preview_render_seconds", "预览图渲染耗时"
+)
+preview_render_failures = registry.counter(
+    "preview_render_failures_total", "预览图渲染失败次数"
+)
+plugin_write_duration = registry.histogram(
+    "plugin_dir_write_seconds", "写入插件目录耗时"
+)
+plugin_write_failures = registry.counter(
+    "plugin_dir_write_failures_total", "写入插件目录失败次数"
+)
+
+# 准入控制
+admission_admitted = registry.counter(
+    "admission_admitted_total", "准入控制放行的请求数", ("route",)
+)
+admission_rejected = registry.counter(
+    "admission_rejected_total", "准入控制拒绝的请求数", ("route", "reason")
+)
+admission_in_flight = registry.gauge(
+    "admission_expensive_in_flight", "正在执行的昂贵请求数"
+)
+
+# 实时计数推送
+sse_subscribers = registry.gauge(
+    "sse_subscribers", "当前 SSE 订阅连接数"
+)
+sse_updates_flushed = registry.counter(
+    "sse_updates_flushed_total", "合并后分发的预设计数更新数"
+)
+
+
+def render_metrics() -> str:
+    """导出全部指标"""
+    return registry.render()
+
+
+class MetricsMiddleware:
+    """采集每个路由的请求耗时、状态码和并发数
+
+    路由标签使用路由模板（如 /api/presets/{preset_id}），避免标签基数随 ID 膨胀。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_names: Optional[Dict[object, str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            method = scope["method"]
+            route = self._route_name(scope)
+            http_request_duration.observe(elapsed, method, route)
+            http_requests_total.inc(method, route, str(status_code))
+
+    def _route_name(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_names is None:
+            self._route_names = _collect_route_names(scope.get("app"))
+        return self._route_names.get(endpoint, "unmatched")
+
+
+def _collect_route_names(app) -> Dict[object, str]:
+    names = {}
+    for route in getattr(app, "routes", []):
+        endpoint = getattr(route, "endpoint", None) or getattr(route, "app", None)
+        if endpoint is not None:
+            names[endpoint] = route.path
+    return names
+
+
+def instrument_engine(engine: AsyncEngine, name: str):
+    """挂载 SQLAlchemy 事件，统计语句次数与耗时"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_queries_total.inc(name, operation)
+        db_query_duration.observe(elapsed, name, operation)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("query_start") if context.connection is not None else None
+        if stack:
+            stack.pop()
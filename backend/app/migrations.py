@@ -0,0 +1,341 @@
+"""数据库 schema 版本迁移
+
+每个迁移有唯一递增的版本号，已执行的版本记录在 schema_version 表中。
+迁移步骤必须幂等（使用 checkfirst / IF NOT EXISTS），中途失败后可以安全重跑。
+
+命令行用法（在 backend 目录下）：
+
+    python -m app.migrations upgrade   # 执行未应用的迁移
+    python -m app.migrations status    # 查看迁移状态
+    python -m app.migrations explain   # 检查热点查询是否命中索引
+"""
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import desc, func, inspect, select, text, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import Base, IS_POSTGRES, contains_filter
+
+# PostgreSQL 下多实例同时启动时用 advisory lock 串行执行迁移
+MIGRATION_LOCK_ID = 7340023
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_index(conn: Connection, table_name: str, index_name: str):
+    """按模型中的定义创建索引（已存在则跳过）"""
+    table = Base.metadata.tables[table_name]
+    for index in table.indexes:
+        if index.name == index_name:
+            index.create(conn, checkfirst=True)
+            return
+    raise LookupError(f"模型中未定义索引 {table_name}.{index_name}")
+
+
+def _initial_schema(conn: Connection):
+    """创建全部表（已存在的表保持不变）"""
+    if conn.dialect.name == "postgresql":
+        # 服务器未安装 contrib 或无建扩展权限时继续迁移，名称搜索退化为不走索引的 ILIKE
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            print(f"⚠️  无法启用 pg_trgm 扩展，跳过名称搜索的三元组索引: {e.orig}")
+    Base.metadata.create_all(conn)
+
+
+def _unique_likes(conn: Connection):
+    """点赞去重并建立 (preset_id, user_id) 唯一索引，以及 PostgreSQL 三元组搜索索引"""
+    conn.execute(text(
+        "DELETE FROM likes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM likes GROUP BY preset_id, user_id)"
+    ))
+    _create_index(conn, "likes", "uq_likes_preset_user")
+    if conn.dialect.name == "postgresql":
+        _create_index(conn, "presets", "ix_presets_name_trgm")
+
+
+def _hot_query_indexes(conn: Connection):
+    """列表排序、评论分页、用户点赞查询的复合索引"""
+    _create_index(conn, "presets", "ix_presets_public_created")
+    _create_index(conn, "presets", "ix_presets_public_downloads")
+    _create_index(conn, "presets", "ix_presets_public_likes")
+    _create_index(conn, "comments", "ix_comments_preset_created")
+    _create_index(conn, "likes", "ix_likes_user_preset")
+
+
+# (子表, 外键列, 父表)
+CASCADE_FOREIGN_KEYS = [
+    ("presets", "author_id", "users"),
+    ("comments", "preset_id", "presets"),
+    ("comments", "author_id", "users"),
+    ("likes", "preset_id", "presets"),
+    ("likes", "user_id", "users"),
+]
+
+
+def _rebuild_sqlite_table(conn: Connection, table_name: str):
+    """按当前模型定义重建 SQLite 表（SQLite 不支持修改已有外键）"""
+    table = Base.metadata.tables[table_name]
+    new_name = f"{table_name}__new"
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table_name})"))}
+    columns = ", ".join(c.name for c in table.columns if c.name in existing)
+    create_sql = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(create_sql.replace(f"CREATE TABLE {table_name} (", f"CREATE TABLE {new_name} (", 1)))
+    conn.execute(text(f"INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {table_name}"))
+    conn.execute(text(f"DROP TABLE {table_name}"))
+    conn.execute(text(f"ALTER TABLE {new_name} RENAME TO {table_name}"))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _cascade_foreign_keys(conn: Connection):
+    """外键改为 ON DELETE CASCADE，删除预设 / 用户时由数据库批量删除子记录"""
+    # 先清理历史遗留的孤儿记录，否则新约束无法建立
+    for child, column, parent in reversed(CASCADE_FOREIGN_KEYS):
+        conn.execute(text(
+            f"DELETE FROM {child} WHERE {column} NOT IN (SELECT id FROM {parent})"
+        ))
+
+    inspector = inspect(conn)
+    pending = []
+    for child, column, parent in CASCADE_FOREIGN_KEYS:
+        for fk in inspector.get_foreign_keys(child):
+            if fk["constrained_columns"] == [column] and fk["referred_table"] == parent:
+                if (fk.get("options") or {}).get("ondelete", "").upper() != "CASCADE":
+                    pending.append((child, column, parent, fk.get("name")))
+
+    if conn.dialect.name == "sqlite":
+        for table_name in dict.fromkeys(child for child, _, _, _ in pending):
+            _rebuild_sqlite_table(conn, table_name)
+        problems = conn.execute(text("PRAGMA foreign_key_check")).all()
+        if problems:
+            raise RuntimeError(f"外键检查失败: {problems}")
+        return
+
+    for child, column, parent, name in pending:
+        name = name or f"{child}_{column}_fkey"
+        conn.execute(text(f'ALTER TABLE {child} DROP CONSTRAINT "{name}"'))
+        conn.execute(text(
+            f'ALTER TABLE {child} ADD CONSTRAINT "{name}" FOREIGN KEY ({column}) '
+            f"REFERENCES {parent} (id) ON DELETE CASCADE"
+        ))
+
+
+def _preset_versions(conn: Connection):
+    """预设版本历史表"""
+    Base.metadata.tables["preset_versions"].create(conn, checkfirst=True)
+
+
+def _trending(conn: Connection):
+    """热门分数列、索引与按小时汇总的活动表"""
+    columns = {column["name"] for column in inspect(conn).get_columns("presets")}
+    if "trending_score" not in columns:
+        conn.execute(text("ALTER TABLE presets ADD COLUMN trending_score FLOAT NOT NULL DEFAULT 0"))
+    _create_index(conn, "presets", "ix_presets_public_trending")
+    Base.metadata.tables["preset_activity"].create(conn, checkfirst=True)
+
+
+def _author_presets(conn: Connection):
+    """作者预设列表索引"""
+    _create_index(conn, "presets", "ix_presets_author_created")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "初始表结构", _initial_schema),
+    Migration(2, "点赞唯一索引与三元组搜索索引", _unique_likes),
+    Migration(3, "热点查询复合索引", _hot_query_indexes),
+    Migration(4, "外键级联删除", _cascade_foreign_keys),
+    Migration(5, "预设版本历史", _preset_versions),
+    Migration(6, "热门排序分数与活动统计", _trending),
+    Migration(7, "作者预设列表索引", _author_presets),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def _applied_versions(conn: Connection) -> set:
+    return set(conn.execute(text("SELECT version FROM schema_version")).scalars().all())
+
+
+def _upgrade(conn: Connection) -> List[Migration]:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})"))
+    _ensure_version_table(conn)
+    applied = _applied_versions(conn)
+    executed = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        migration.upgrade(conn)
+        conn.execute(
+            text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+            {"version": migration.version, "description": migration.description},
+        )
+        executed.append(migration)
+    return executed
+
+
+async def current_version(engine: AsyncEngine) -> Optional[int]:
+    """读取已应用的最高 schema 版本，尚未初始化时返回 None"""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(text("SELECT MAX(version) FROM schema_version"))).scalar()
+    except DBAPIError:
+        return None
+
+
+async def run_migrations(engine: AsyncEngine) -> List[Migration]:
+    """执行全部未应用的迁移，返回本次执行的迁移列表"""
+    # 常规启动只需一次版本查询，schema 已是最新时跳过建表与反射
+    if await current_version(engine) == LATEST_VERSION:
+        return []
+
+    import app.models  # noqa: F401  注册全部模型到 Base.metadata
+
+    async with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # 重建表期间必须关闭外键，否则 DROP TABLE 会触发级联删除
+            await conn.execute(text("PRAGMA foreign_keys=OFF"))
+            await conn.commit()
+        try:
+            async with conn.begin():
+                executed = await conn.run_sync(_upgrade)
+        finally:
+            if sqlite:
+                await conn.execute(text("PRAGMA foreign_keys=ON"))
+                await conn.commit()
+    for migration in executed:
+        print(f"🛠️  已应用迁移 {migration.version}: {migration.description}")
+    return executed
+
+
+async def migration_status(engine: AsyncEngine) -> List[Tuple[Migration, bool]]:
+    """返回每个迁移及其是否已应用"""
+    async with engine.begin() as conn:
+        await conn.run_sync(_ensure_version_table)
+        applied = await conn.run_sync(_applied_versions)
+    return [(migration, migration.version in applied) for migration in MIGRATIONS]
+
+
+def hot_queries() -> List[Tuple[str, object]]:
+    """各接口的热点查询，用于检查执行计划"""
+    from app.models import Preset, Comment, Like, PresetVersion, PresetActivity
+
+    public = select(Preset).where(Preset.is_public == True)
+    cursor_score = select(Preset.trending_score).where(Preset.id == 1).scalar_subquery()
+    return [
+        ("list_presets latest", public.order_by(desc(Preset.created_at), desc(Preset.id)).limit(20)),
+        ("list_presets popular", public.order_by(desc(Preset.download_count), desc(Preset.id)).limit(20)),
+        ("list_presets likes", public.order_by(desc(Preset.like_count), desc(Preset.id)).limit(20)),
+        ("list_presets trending", public.order_by(desc(Preset.trending_score), desc(Preset.id)).limit(20)),
+        ("list_presets trending cursor", public.where(
+            tuple_(Preset.trending_score, Preset.id) < tuple_(func.coalesce(cursor_score, 0.5), 1)
+        ).order_by(desc(Preset.trending_score), desc(Preset.id)).limit(20)),
+        ("list_presets count", select(Preset.id).where(Preset.is_public == True)),
+        ("get_preset", select(Preset).where(Preset.id == 1)),
+        ("create_preset slug", select(Preset.id).where(Preset.slug == "slug")),
+        ("get_comments", select(Comment).where(Comment.preset_id == 1).order_by(desc(Comment.created_at)).limit(20)),
+        ("user liked presets", select(Like.preset_id).where(Like.user_id == 1)),
+        ("toggle_like lookup", select(Like.id).where(Like.preset_id == 1, Like.user_id == 1)),
+        ("trending activity prune", select(PresetActivity.id).where(PresetActivity.bucket < 1)),
+        ("author presets", select(Preset).where(Preset.author_id == 1).order_by(desc(Preset.created_at), desc(Preset.id)).limit(20)),
+        ("author stats", select(func.count(Preset.id), func.sum(Preset.download_count)).where(Preset.author_id == 1)),
+        ("preset versions", select(PresetVersion.version).where(PresetVersion.preset_id == 1).order_by(desc(PresetVersion.version))),
+    ] + ([
+        ("list_presets search", public.where(contains_filter(Preset.name, "abc")).limit(20)),
+    ] if IS_POSTGRES else [])
+
+
+def _plan_problems(dialect: str, plan: List[str]) -> List[str]:
+    """从执行计划中找出全表扫描和额外排序"""
+    problems = []
+    for line in plan:
+        if dialect == "sqlite":
+            if line.startswith("SCAN ") and " USING " not in line:
+                problems.append(line)
+            elif "USE TEMP B-TREE" in line:
+                problems.append(line)
+        elif "Seq Scan" in line:
+            problems.append(line.strip())
+    return problems
+
+
+async def explain_hot_queries(engine: AsyncEngine) -> bool:
+    """打印热点查询的执行计划，全部命中索引时返回 True"""
+    import app.models  # noqa: F401
+
+    ok = True
+    async with engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            # 小表上规划器会倾向顺序扫描，检查时禁用以确认索引可用
+            await conn.execute(text("SET enable_seqscan = off"))
+            trgm = await conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+            if trgm.first() is None:
+                ok = False
+                print("❌ 未安装 pg_trgm 扩展，名称搜索无法使用三元组索引")
+        for name, query in hot_queries():
+            compiled = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+            prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+            rows = (await conn.execute(text(prefix + str(compiled)))).all()
+            plan = [row[-1] for row in rows]
+            problems = _plan_problems(dialect, plan)
+            ok = ok and not problems
+            print(f"{'✅' if not problems else '❌'} {name}")
+            for line in plan:
+                print(f"    {line}")
+    return ok
+
+
+def main():
+    from app.database import write_engine, close_db
+
+    parser = argparse.ArgumentParser(description="数据库 schema 迁移")
+    parser.add_argument("command", choices=["upgrade", "status", "explain"], nargs="?", default="upgrade")
+    args = parser.parse_args()
+
+    async def run() -> int:
+        try:
+            if args.command == "upgrade":
+                executed = await run_migrations(write_engine)
+                if not executed:
+                    print(f"schema 已是最新版本 {LATEST_VERSION}")
+            elif args.command == "status":
+                for migration, applied in await migration_status(write_engine):
+                    print(f"{'✅' if applied else '⏳'} {migration.version}: {migration.description}")
+            elif args.command == "explain":
+                await run_migrations(write_engine)
+                if not await explain_hot_queries(write_engine):
+                    return 1
+            return 0
+        finally:
+            await close_db()
+
+    sys.exit(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
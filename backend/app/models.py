@@ -1,10 +1,17 @@
 """数据库模型"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index, Float, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
 
+def _has_pg_trgm(ddl, target, bind, **kw) -> bool:
+    """pg_trgm 扩展已安装时才创建三元组索引（只编译 DDL 时视为已安装）"""
+    if bind is None:
+        return True
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
 class User(Base):
     """用户模型"""
     __tablename__ = "users"
@@ -17,9 +24,10 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    presets = relationship("Preset", back_populates="author", cascade="all, delete-orphan")
-    comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan")
-    likes = relationship("Like", back_populates="user", cascade="all, delete-orphan")
+    # 子记录由数据库 ON DELETE CASCADE 删除，ORM 不再逐条加载
+    presets = relationship("Preset", back_populates="author", cascade="all, delete-orphan", passive_deletes=True)
+    comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan", passive_deletes=True)
+    likes = relationship("Like", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Preset(Base):
@@ -32,17 +40,37 @@ class Preset(Base):
     description = Column(Text)
     layout = Column(Text, nullable=False)  # JSON 字符串
     preview_image = Column(String(500))  # 预览图路径
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     download_count = Column(Integer, default=0)
     like_count = Column(Integer, default=0)
     comment_count = Column(Integer, default=0)
     is_public = Column(Boolean, default=True)
+    # 由后台任务根据 preset_activity 定期重算的热门分数
+    trending_score = Column(Float, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     author = relationship("User", back_populates="presets")
-    comments = relationship("Comment", back_populates="preset", cascade="all, delete-orphan")
-    likes = relationship("Like", back_populates="preset", cascade="all, delete-orphan")
+    comments = relationship("Comment", back_populates="preset", cascade="all, delete-orphan", passive_deletes=True)
+    likes = relationship("Like", back_populates="preset", cascade="all, delete-orphan", passive_deletes=True)
+    versions = relationship("PresetVersion", back_populates="preset", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # 列表排序：公开预设按时间 / 下载 / 点赞倒序
+        Index("ix_presets_public_created", "is_public", "created_at"),
+        Index("ix_presets_public_downloads", "is_public", "download_count"),
+        Index("ix_presets_public_likes", "is_public", "like_count"),
+        Index("ix_presets_public_trending", "is_public", "trending_score", "id"),
+        # 作者的预设列表按时间倒序
+        Index("ix_presets_author_created", "author_id", "created_at", "id"),
+        # PostgreSQL 下名称搜索走 pg_trgm GIN 索引
+        Index(
+            "ix_presets_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql", callable_=_has_pg_trgm),
+    )
 
 
 class Comment(Base):
@@ -51,28 +79,71 @@ class Comment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    preset_id = Column(Integer, ForeignKey("presets.id"), nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    preset_id = Column(Integer, ForeignKey("presets.id", ondelete="CASCADE"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     preset = relationship("Preset", back_populates="comments")
     author = relationship("User", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_preset_created", "preset_id", "created_at"),
+    )
+
 
 class Like(Base):
     """点赞模型"""
     __tablename__ = "likes"
 
     id = Column(Integer, primary_key=True, index=True)
-    preset_id = Column(Integer, ForeignKey("presets.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    preset_id = Column(Integer, ForeignKey("presets.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     preset = relationship("Preset", back_populates="likes")
     user = relationship("User", back_populates="likes")
 
     __table_args__ = (
+        Index("uq_likes_preset_user", "preset_id", "user_id", unique=True),
+        # 查询某用户点赞过的预设
+        Index("ix_likes_user_preset", "user_id", "preset_id"),
         {"sqlite_autoincrement": True},
     )
 
+
+class PresetVersion(Base):
+    """预设版本历史模型"""
+    __tablename__ = "preset_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    preset_id = Column(Integer, ForeignKey("presets.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    # 快照保存完整布局 JSON，否则保存相对上一版本的 JSON Patch
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    preset = relationship("Preset", back_populates="versions")
+
+    __table_args__ = (
+        Index("uq_preset_versions_preset_version", "preset_id", "version", unique=True),
+    )
+
+
+class PresetActivity(Base):
+    """预设活动按小时汇总，用于计算热门分数"""
+    __tablename__ = "preset_activity"
+
+    id = Column(Integer, primary_key=True, index=True)
+    preset_id = Column(Integer, ForeignKey("presets.id", ondelete="CASCADE"), nullable=False)
+    bucket = Column(Integer, nullable=False)  # Unix 时间 // 3600
+    downloads = Column(Integer, nullable=False, default=0)
+    likes = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("uq_preset_activity_preset_bucket", "preset_id", "bucket", unique=True),
+        # 清理过期的桶
+        Index("ix_preset_activity_bucket", "bucket"),
+    )
@@ -3,17 +3,36 @@ import json
 import os
 from pathlib import Path
 from typing import Dict, Any, Optional
-from PIL import Image, ImageDraw, ImageFont
 import tempfile
 
+from app.metrics import preview_render_duration, preview_render_failures
+
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 PREVIEW_DIR = UPLOAD_DIR / "previews"
-PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+
+_preview_dir_ready = False
+
+
+def _ensure_preview_dir():
+    """首次渲染时创建预览图目录"""
+    global _preview_dir_ready
+    if not _preview_dir_ready:
+        PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+        _preview_dir_ready = True
 
 
 async def generate_preview_image(layout: Dict[str, Any]) -> Optional[str]:
     """根据布局配置生成预览图"""
+    with preview_render_duration.time():
+        return _render_preview(layout)
+
+
+def _render_preview(layout: Dict[str, Any]) -> Optional[str]:
+    """绘制并保存预览图，失败时返回默认预览图路径"""
     try:
+        # Pillow 较重，首次渲染时才导入，缩短启动时间
+        from PIL import Image, ImageDraw, ImageFont
+        
         # 获取画布尺寸
         canvas_width = layout.get("canvas_width", 1600)
         canvas_height = layout.get("canvas_height", 600)
@@ -65,10 +84,12 @@ async def generate_preview_image(layout: Dict[str, Any]) -> Optional[str]:
         # 保存预览图
         preview_filename = f"preview_{hash(json.dumps(layout, sort_keys=True))}.png"
         preview_path = PREVIEW_DIR / preview_filename
+        _ensure_preview_dir()
         canvas.save(preview_path, "PNG")
         
         return f"/uploads/previews/{preview_filename}"
     except Exception as e:
+        preview_render_failures.inc()
         print(f"生成预览图失败: {e}")
         # 返回默认预览图路径
         return "/static/default-preview.png"
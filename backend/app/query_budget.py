@@ -0,0 +1,126 @@
+"""请求级 SQL 查询统计、慢查询日志与查询次数断言
+
+每个请求在 contextvar 中持有一个 QueryStats，引擎事件把语句次数与耗时累加到其中。
+DEBUG 模式下响应附带 Server-Timing 头；超过 SLOW_QUERY_MS 的语句连同参数打印到日志。
+
+测试中可用 assert_max_queries 约束接口的查询次数，防止 N+1 回归：
+
+    with assert_max_queries(3):
+        await client.get("/api/presets/1")
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+load_dotenv()
+
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+
+class QueryStats:
+    """一次请求（或一段代码）内的查询统计"""
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self, record_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        # 仅在断言场景记录语句，便于定位多出来的查询
+        self.statements: Optional[List[Tuple[str, float]]] = [] if record_statements else None
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def _record(statement: str, parameters, elapsed: float):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+        if stats.statements is not None:
+            stats.statements.append((statement, elapsed))
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        print(f"🐢 慢查询 {elapsed * 1000:.1f}ms: {' '.join(statement.split())} 参数: {parameters!r}")
+
+
+def track_engine(engine: AsyncEngine):
+    """挂载引擎事件，把每条语句计入当前请求"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("budget_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _record(statement, parameters, time.perf_counter() - conn.info["budget_start"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("budget_start") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+@contextmanager
+def assert_max_queries(max_count: int) -> Iterator[QueryStats]:
+    """断言代码块内执行的 SQL 不超过 max_count 条"""
+    stats = QueryStats(record_statements=True)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+    if stats.count > max_count:
+        listing = "\n".join(
+            f"  {i}. [{elapsed * 1000:.1f}ms] {' '.join(statement.split())}"
+            for i, (statement, elapsed) in enumerate(stats.statements, 1)
+        )
+        raise AssertionError(f"执行了 {stats.count} 条查询，超过上限 {max_count}：\n{listing}")
+
+
+class QueryBudgetMiddleware:
+    """为每个请求建立查询统计，DEBUG 模式下输出 Server-Timing 头"""
+
+    def __init__(self, app, debug: bool = DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 外层已有统计（如 assert_max_queries）时沿用，让断言覆盖整个请求
+        stats = _current_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = _current_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if self.debug and message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                value = (
+                    f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                    f"app;dur={total_ms:.2f}"
+                )
+                message = {**message, "headers": list(message["headers"]) + [(b"server-timing", value.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                _current_stats.reset(token)
@@ -0,0 +1,219 @@
+"""昂贵接口的准入控制
+
+- 按客户端（登录用户 ID，否则 IP）的令牌桶限流，不同接口消耗不同令牌数，超限返回 429
+- 昂贵接口共享一个全局并发上限，满载时直接返回 503，不做无限排队
+
+两者都带 Retry-After 头。用法：
+
+    @router.post("", dependencies=[admission("create_preset")])
+"""
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request
+
+from app.metrics import admission_admitted, admission_rejected, admission_in_flight
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# 按单个用户的正常使用量设定：可连续下载 60 次，之后每秒恢复 1 个令牌
+RATE_LIMIT_CAPACITY = float(os.getenv("RATE_LIMIT_CAPACITY", "60"))
+RATE_LIMIT_REFILL_PER_SEC = float(os.getenv("RATE_LIMIT_REFILL_PER_SEC", "1"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+EXPENSIVE_CONCURRENCY = int(os.getenv("EXPENSIVE_CONCURRENCY", "8"))
+# 只信任这些直连对端转发的客户端 IP：逗号分隔的 IP、网段或主机名，默认为 docker-compose 中的前端 nginx 服务
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "frontend")
+# 主机名解析结果的缓存时间（秒），容器重建后代理的 IP 会变化
+TRUSTED_PROXIES_REFRESH = 60
+
+
+def _parse_costs(value: str) -> Dict[str, float]:
+    costs = {}
+    for item in value.split(","):
+        name, _, cost = item.partition("=")
+        if name.strip() and cost.strip():
+            costs[name.strip()] = float(cost)
+    return costs
+
+
+# 各接口每次请求消耗的令牌数
+DEFAULT_COSTS = "create_preset=5,update_preset=2,download_preset=1,search=1"
+RATE_LIMIT_COSTS = _parse_costs(os.getenv("RATE_LIMIT_COSTS", DEFAULT_COSTS))
+
+class TokenBucketLimiter:
+    """按键分桶的令牌桶"""
+
+    def __init__(self, capacity: float, refill_per_sec: float, max_keys: int):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.max_keys = max_keys
+        # key -> [剩余令牌, 上次补充时间]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def acquire(self, key: str, cost: float) -> float:
+        """尝试扣除令牌；成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        cost = min(cost, self.capacity)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            bucket = self._buckets[key] = [self.capacity, now]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_sec)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        if self.refill_per_sec <= 0:
+            return float("inf")
+        return (cost - bucket[0]) / self.refill_per_sec
+
+    def _evict(self, now: float):
+        """清理已回满的桶（等同于新桶），仍超限时丢弃最久未用的一半"""
+        full_after = self.capacity / self.refill_per_sec if self.refill_per_sec > 0 else float("inf")
+        idle = [key for key, (_, last) in self._buckets.items() if now - last >= full_after]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            oldest = sorted(self._buckets.items(), key=lambda item: item[1][1])
+            for key, _ in oldest[: len(oldest) // 2]:
+                del self._buckets[key]
+
+    def reset(self):
+        self._buckets.clear()
+
+
+class ConcurrencyLimiter:
+    """非阻塞并发上限：满载时立即拒绝"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        admission_in_flight.inc()
+        return True
+
+    def release(self):
+        self.active -= 1
+        admission_in_flight.dec()
+
+
+class TrustedProxies:
+    """受信任代理的地址集合，主机名按需解析并缓存"""
+
+    def __init__(self, value: str):
+        self.networks = []
+        self.hostnames = []
+        for item in value.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                self.networks.append(ipaddress.ip_network(item, strict=False))
+            except ValueError:
+                self.hostnames.append(item)
+        self._resolved = set()
+        self._resolved_at = -math.inf
+
+    async def contains(self, peer: Optional[str]) -> bool:
+        if not peer:
+            return False
+        try:
+            address = ipaddress.ip_address(peer.split("%", 1)[0])
+        except ValueError:
+            return False
+        if any(address in network for network in self.networks):
+            return True
+        if not self.hostnames:
+            return False
+        # 未命中时最多每 5 秒重新解析一次，代理换了 IP 也能很快识别
+        age = time.monotonic() - self._resolved_at
+        if age >= TRUSTED_PROXIES_REFRESH or (address not in self._resolved and age >= 5):
+            await self._resolve()
+        return address in self._resolved
+
+    async def _resolve(self):
+        self._resolved_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        resolved = set()
+        for hostname in self.hostnames:
+            try:
+                infos = await loop.getaddrinfo(hostname, None)
+            except OSError:
+                continue
+            resolved.update(ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos)
+        self._resolved = resolved
+
+
+limiter = TokenBucketLimiter(RATE_LIMIT_CAPACITY, RATE_LIMIT_REFILL_PER_SEC, RATE_LIMIT_MAX_KEYS)
+concurrency = ConcurrencyLimiter(EXPENSIVE_CONCURRENCY)
+trusted_proxies = TrustedProxies(TRUSTED_PROXIES)
+
+
+async def client_key(request: Request) -> str:
+    """限流键：已登录用户按用户 ID，否则按客户端 IP"""
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        from app.auth import decode_access_token
+
+        payload = decode_access_token(authorization[7:])
+        if payload and payload.get("sub") is not None:
+            return f"user:{payload['sub']}"
+    peer = request.client.host if request.client else None
+    if await trusted_proxies.contains(peer):
+        # X-Real-IP 由 nginx 以 $remote_addr 覆盖写入，客户端无法伪造
+        real_ip = request.headers.get("x-real-ip")
+        if real_ip:
+            return f"ip:{real_ip.strip()}"
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # 最右一项由离后端最近的代理追加，前面的可能由客户端伪造
+            return f"ip:{forwarded.split(',')[-1].strip()}"
+    return f"ip:{peer or 'unknown'}"
+
+
+def admission(route: str, when: Optional[Callable[[Request], bool]] = None):
+    """返回路由依赖：按 route 的令牌消耗限流，并占用一个昂贵请求并发名额
+
+    when 为可选条件，仅当其返回 True 时才对该请求做准入控制。
+    """
+    cost = RATE_LIMIT_COSTS.get(route, 1.0)
+
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED or (when is not None and not when(request)):
+            yield
+            return
+
+        wait = limiter.acquire(await client_key(request), cost)
+        if wait > 0:
+            admission_rejected.inc(route, "rate_limited")
+            raise HTTPException(
+                status_code=429,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(max(1, math.ceil(min(wait, 3600))))},
+            )
+        if not concurrency.try_acquire():
+            admission_rejected.inc(route, "overloaded")
+            raise HTTPException(
+                status_code=503,
+                detail="服务繁忙，请稍后再试",
+                headers={"Retry-After": "1"},
+            )
+        admission_admitted.inc(route)
+        try:
+            yield
+        finally:
+            concurrency.release()
+
+    return Depends(dependency)
@@ -0,0 +1,233 @@
+"""相似预设推荐
+
+把布局中的画布、文本框、字号、内边距和颜色字段转换为定长特征向量，
+全部公开预设的向量保存在一个 NumPy 矩阵中，查询时一次矩阵运算算出到所有预设的距离：
+|a - b|² = |a|² - 2a·b + |b|²，其中各行的 |a|² 预先算好，查询只需一次矩阵-向量乘法。
+
+启动时在后台从数据库构建，之后随预设创建、修改布局、公开状态变化和删除增量更新。
+NumPy 只在构建索引时导入，不影响启动耗时。
+"""
+import asyncio
+import json
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.background_index import BackgroundIndex
+
+# 与 preview.py 中的默认值保持一致
+DEFAULT_CANVAS_WIDTH = 1600
+DEFAULT_CANVAS_HEIGHT = 600
+DEFAULT_BACKGROUND = "#05060a"
+DEFAULT_TEXT_COLOR = "#ffffff"
+DEFAULT_TEXT_BG = "rgba(0,0,0,0.52)"
+DEFAULT_FONT_SIZE = 56
+DEFAULT_PADDING = 28
+
+# 各特征的权重：几何比例 0~1，颜色分量 0~1，宽高比取对数
+FEATURE_WEIGHTS = (
+    [1.0]                    # log(宽高比)
+    + [1.0] * 4              # 文本框位置与尺寸（相对画布）
+    + [2.0, 1.0]             # 字号、内边距（相对画布高度）
+    + [0.6] * 3              # 文字颜色
+    + [0.6] * 3              # 背景颜色
+    + [0.6] * 3 + [0.8]      # 文本框背景颜色与透明度
+)
+FEATURE_SIZE = len(FEATURE_WEIGHTS)
+
+_RGBA = re.compile(r"rgba?\(([^)]*)\)")
+
+
+def parse_color(value, default: str) -> Tuple[float, float, float, float]:
+    """解析 #rgb / #rrggbb / rgb() / rgba()，返回 0~1 的 RGBA"""
+    if not isinstance(value, str):
+        value = default
+    value = value.strip().lower()
+    try:
+        if value.startswith("#"):
+            hex_value = value[1:]
+            if len(hex_value) == 3:
+                hex_value = "".join(c * 2 for c in hex_value)
+            return (
+                int(hex_value[0:2], 16) / 255,
+                int(hex_value[2:4], 16) / 255,
+                int(hex_value[4:6], 16) / 255,
+                1.0,
+            )
+        match = _RGBA.match(value)
+        if match:
+            parts = [p.strip() for p in match.group(1).split(",")]
+            alpha = float(parts[3]) if len(parts) > 3 else 1.0
+            return (float(parts[0]) / 255, float(parts[1]) / 255, float(parts[2]) / 255, alpha)
+    except (ValueError, IndexError):
+        pass
+    if value != default:
+        return parse_color(default, default)
+    return (0.0, 0.0, 0.0, 1.0)
+
+
+def _number(layout: dict, key: str, default: float) -> float:
+    value = layout.get(key, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def layout_features(layout: dict) -> List[float]:
+    """布局 -> 加权特征向量"""
+    if not isinstance(layout, dict):
+        layout = {}
+    width = max(_number(layout, "canvas_width", DEFAULT_CANVAS_WIDTH), 1.0)
+    height = max(_number(layout, "canvas_height", DEFAULT_CANVAS_HEIGHT), 1.0)
+    text_r, text_g, text_b, _ = parse_color(layout.get("text_color"), DEFAULT_TEXT_COLOR)
+    bg_r, bg_g, bg_b, _ = parse_color(layout.get("background_color"), DEFAULT_BACKGROUND)
+    box_r, box_g, box_b, box_a = parse_color(layout.get("text_bg"), DEFAULT_TEXT_BG)
+    features = [
+        math.log(width / height),
+        _number(layout, "box_left", 0) / width,
+        _number(layout, "box_top", 0) / height,
+        _number(layout, "box_width", width) / width,
+        _number(layout, "box_height", height) / height,
+        _number(layout, "font_size", DEFAULT_FONT_SIZE) / height,
+        _number(layout, "padding", DEFAULT_PADDING) / height,
+        text_r, text_g, text_b,
+        bg_r, bg_g, bg_b,
+        box_r, box_g, box_b, box_a,
+    ]
+    return [value * weight for value, weight in zip(features, FEATURE_WEIGHTS)]
+
+
+def _loads(layout) -> dict:
+    if isinstance(layout, str):
+        try:
+            return json.loads(layout)
+        except ValueError:
+            return {}
+    return layout or {}
+
+
+class SimilarIndex(BackgroundIndex):
+    """公开预设特征矩阵，行按 preset_id 映射，删除时用最后一行填补空位"""
+
+    name = "相似推荐索引"
+
+    def __init__(self):
+        super().__init__()
+        self._matrix = None
+        self._ids = None
+        self._norms = None
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+
+    async def _build_snapshot(self):
+        """分批读取公开预设布局并计算特征"""
+        from app.database import AsyncSessionLocal
+        from app.models import Preset
+
+        ids: List[int] = []
+        vectors: List[List[float]] = []
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(
+                select(Preset.id, Preset.layout).where(Preset.is_public == True)
+            )
+            async for rows in result.partitions(500):
+                # JSON 解析在线程中完成，不阻塞事件循环
+                batch = await asyncio.to_thread(
+                    lambda rows=rows: [layout_features(_loads(row.layout)) for row in rows]
+                )
+                ids.extend(row.id for row in rows)
+                vectors.extend(batch)
+        return ids, vectors
+
+    def _apply(self, snapshot: Tuple[List[int], List[List[float]]]):
+        ids, vectors = snapshot
+        self._load(ids, vectors)
+        print(f"🧭 相似推荐索引已构建: {len(ids)} 个预设")
+
+    def _load(self, ids: List[int], vectors: List[List[float]]):
+        import numpy as np
+
+        capacity = max(64, len(ids) * 2)
+        self._matrix = np.zeros((capacity, FEATURE_SIZE), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        if ids:
+            self._matrix[:len(ids)] = np.asarray(vectors, dtype=np.float32)
+            self._ids[:len(ids)] = ids
+            self._norms[:len(ids)] = (self._matrix[:len(ids)] ** 2).sum(axis=1)
+        self._rows = {preset_id: row for row, preset_id in enumerate(ids)}
+        self._size = len(ids)
+
+    def upsert(self, preset_id: int, layout):
+        """新增或更新一个公开预设的特征"""
+        if self._defer(self.upsert, preset_id, layout):
+            return
+        if self._matrix is None:
+            self._load([], [])
+        import numpy as np
+
+        vector = layout_features(_loads(layout))
+        row = self._rows.get(preset_id)
+        if row is None:
+            if self._size == len(self._matrix):
+                # 容量翻倍
+                self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+                self._ids = np.concatenate([self._ids, np.zeros_like(self._ids)])
+                self._norms = np.concatenate([self._norms, np.zeros_like(self._norms)])
+            row = self._size
+            self._size += 1
+            self._rows[preset_id] = row
+            self._ids[row] = preset_id
+        self._matrix[row] = vector
+        self._norms[row] = (self._matrix[row] ** 2).sum()
+
+    def remove(self, preset_id: int):
+        """移除预设（删除或取消公开）"""
+        if self._defer(self.remove, preset_id):
+            return
+        row = self._rows.pop(preset_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._norms[row] = self._norms[last]
+            self._rows[moved_id] = row
+        self._size = last
+
+    def vector(self, preset_id: int, layout=None):
+        """已索引的预设直接取矩阵中的行，否则（如未公开）按布局计算"""
+        import numpy as np
+
+        row = self._rows.get(preset_id)
+        if row is not None:
+            return self._matrix[row]
+        return np.asarray(layout_features(_loads(layout)), dtype=np.float32)
+
+    def nearest(self, vector, limit: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """返回距离最近的 limit 个 (preset_id, 距离)"""
+        import numpy as np
+
+        if self._size == 0:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        squared = self._norms[:self._size] - 2 * (self._matrix[:self._size] @ vector) + vector @ vector
+        # 浮点误差可能产生极小的负数
+        distances = np.sqrt(np.maximum(squared, 0))
+        exclude_row = self._rows.get(exclude) if exclude is not None else None
+        if exclude_row is not None:
+            distances[exclude_row] = np.inf
+        count = min(limit, self._size - (exclude_row is not None))
+        if count <= 0:
+            return []
+        top = np.argpartition(distances, count - 1)[:count]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [(int(self._ids[row]), float(distances[row])) for row in top]
+
+
+similar_index = SimilarIndex()
@@ -0,0 +1,196 @@
+"""搜索联想：公开预设名称的内存前缀索引
+
+索引是按字典序排列的 (key, preset_id) 数组，查询时 bisect 定位前缀对应的区间，
+再按下载量取前 N 个，不访问数据库。每个预设的 key 包括：
+
+- 小写的完整名称、名称中的每个词、slug
+- 中文名称（及每个词）的拼音首字母与全拼，如 “夜景” -> “yj”、“yejing”（需要安装 pypinyin）
+
+启动时在后台从数据库构建，之后随创建、改名、公开状态变化、删除和下载增量更新。
+
+短前缀（如单个字母）会命中大量 key，其排序结果缓存 SUGGEST_CACHE_TTL 秒，
+预设增删或改名时整体失效；命中区间较小的查询总是实时计算。
+"""
+import asyncio
+import heapq
+import os
+import re
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from app.background_index import BackgroundIndex
+
+load_dotenv()
+
+# 单次查询最多参与排序的 key 数
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "20000"))
+# 命中 key 数超过该值的查询结果进入缓存
+SUGGEST_CACHE_MIN_RANGE = int(os.getenv("SUGGEST_CACHE_MIN_RANGE", "256"))
+SUGGEST_CACHE_TTL = float(os.getenv("SUGGEST_CACHE_TTL", "60"))
+SUGGEST_CACHE_SIZE = 1024
+
+_WORD_SPLIT = re.compile(r"[\s\-_·,，。.、/|]+")
+_CJK = re.compile(r"[一-鿿]")
+
+
+def _pinyin_keys(text: str) -> List[str]:
+    """拼音首字母与全拼，未安装 pypinyin 时返回空列表"""
+    if not _CJK.search(text):
+        return []
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        return []
+    initials = "".join(lazy_pinyin(text, style=Style.FIRST_LETTER)).replace(" ", "")
+    full = "".join(lazy_pinyin(text)).replace(" ", "")
+    return [initials.lower(), full.lower()]
+
+
+def index_keys(name: str, slug: str) -> Set[str]:
+    """预设在索引中的全部 key"""
+    name = name.strip().lower()
+    keys = {name, slug.lower()}
+    keys.update(_pinyin_keys(name))
+    words = [word for word in _WORD_SPLIT.split(name) if word]
+    if len(words) > 1:
+        for word in words:
+            keys.add(word)
+            keys.update(_pinyin_keys(word))
+    keys.discard("")
+    return keys
+
+
+class _Entry:
+    __slots__ = ("name", "slug", "download_count", "keys")
+
+    def __init__(self, name: str, slug: str, download_count: int, keys: Set[str]):
+        self.name = name
+        self.slug = slug
+        self.download_count = download_count
+        self.keys = keys
+
+
+class SuggestIndex(BackgroundIndex):
+    """基于有序数组与二分查找的前缀索引"""
+
+    name = "搜索联想索引"
+
+    def __init__(self):
+        super().__init__()
+        self._keys: List[Tuple[str, int]] = []
+        self._entries: Dict[int, _Entry] = {}
+        # (prefix, limit) -> (generation, 过期时间, preset_id 列表)
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[int, float, List[int]]]" = OrderedDict()
+        self._generation = 0
+
+    async def _build_snapshot(self):
+        """从数据库加载全部公开预设"""
+        from app.database import AsyncSessionLocal
+        from app.models import Preset
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Preset.id, Preset.name, Preset.slug, Preset.download_count)
+                .where(Preset.is_public == True)
+            )
+            rows = result.all()
+        # 拼音转换与排序在线程中完成，不阻塞事件循环
+        return await asyncio.to_thread(self._index_rows, rows)
+
+    def _apply(self, snapshot: Tuple[Dict[int, _Entry], List[Tuple[str, int]]]):
+        self._entries, self._keys = snapshot
+        self._generation += 1
+        print(f"🔎 搜索联想索引已构建: {len(self._entries)} 个预设, {len(self._keys)} 个 key")
+
+    @staticmethod
+    def _index_rows(rows) -> Tuple[Dict[int, _Entry], List[Tuple[str, int]]]:
+        entries = {}
+        keys = []
+        for row in rows:
+            entry = _Entry(row.name, row.slug, row.download_count or 0, index_keys(row.name, row.slug))
+            entries[row.id] = entry
+            keys.extend((key, row.id) for key in entry.keys)
+        keys.sort()
+        return entries, keys
+
+    def upsert(self, preset_id: int, name: str, slug: str, download_count: int):
+        """新增或更新一个公开预设"""
+        if self._defer(self.upsert, preset_id, name, slug, download_count):
+            return
+        entry = self._entries.get(preset_id)
+        if entry is not None and entry.name == name and entry.slug == slug:
+            entry.download_count = download_count
+            return
+        self.remove(preset_id)
+        entry = _Entry(name, slug, download_count or 0, index_keys(name, slug))
+        self._entries[preset_id] = entry
+        for key in entry.keys:
+            insort(self._keys, (key, preset_id))
+        self._generation += 1
+
+    def remove(self, preset_id: int):
+        """移除预设（删除或取消公开）"""
+        if self._defer(self.remove, preset_id):
+            return
+        entry = self._entries.pop(preset_id, None)
+        if entry is None:
+            return
+        for key in entry.keys:
+            position = bisect_left(self._keys, (key, preset_id))
+            if position < len(self._keys) and self._keys[position] == (key, preset_id):
+                del self._keys[position]
+        self._generation += 1
+
+    def set_download_count(self, preset_id: int, download_count: int):
+        if self._defer(self.set_download_count, preset_id, download_count):
+            return
+        entry = self._entries.get(preset_id)
+        if entry is not None:
+            entry.download_count = download_count
+
+    def _rank(self, start: int, end: int, limit: int) -> List[int]:
+        entries = self._entries
+        matched = {preset_id for _, preset_id in self._keys[start:end]}
+        return heapq.nlargest(limit, matched, key=lambda i: (entries[i].download_count, -i))
+
+    def search(self, prefix: str, limit: int = 8) -> List[dict]:
+        """返回名称、词、slug 或拼音以 prefix 开头的预设，按下载量倒序"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        keys = self._keys
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + "\U0010ffff",))
+        if end - start <= SUGGEST_CACHE_MIN_RANGE:
+            top = self._rank(start, end, limit)
+        else:
+            cache_key = (prefix, limit)
+            cached = self._cache.get(cache_key)
+            now = time.monotonic()
+            if cached is not None and cached[0] == self._generation and cached[1] > now:
+                self._cache.move_to_end(cache_key)
+                top = cached[2]
+            else:
+                top = self._rank(start, min(end, start + SUGGEST_SCAN_LIMIT), limit)
+                self._cache[cache_key] = (self._generation, now + SUGGEST_CACHE_TTL, top)
+                if len(self._cache) > SUGGEST_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        entries = self._entries
+        return [
+            {
+                "id": preset_id,
+                "name": entries[preset_id].name,
+                "slug": entries[preset_id].slug,
+                "download_count": entries[preset_id].download_count,
+            }
+            for preset_id in top
+        ]
+
+
+suggest_index = SuggestIndex()
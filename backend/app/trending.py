@@ -0,0 +1,158 @@
+"""热门（trending）排序分数
+
+下载、点赞、评论在各自的写任务中累加到按小时分桶的 preset_activity 表；
+后台任务每隔 TRENDING_INTERVAL 秒只为窗口内有活动的预设重新计算衰减分数并写回
+presets.trending_score，列表按该列走索引排序，查询代价与其他排序相同。
+
+分数 = Σ 各小时桶的加权事件数 × 0.5 ^ (距今小时数 / 半衰期)，只统计最近 TRENDING_WINDOW_HOURS 小时；
+活动全部移出窗口的预设分数归零，过期的桶会被清理。
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import write_queue, dialect_insert
+from app.models import Preset, PresetActivity
+
+load_dotenv()
+
+TRENDING_INTERVAL = float(os.getenv("TRENDING_INTERVAL", "300"))
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", "168"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_DOWNLOAD_WEIGHT = float(os.getenv("TRENDING_DOWNLOAD_WEIGHT", "1"))
+TRENDING_LIKE_WEIGHT = float(os.getenv("TRENDING_LIKE_WEIGHT", "3"))
+TRENDING_COMMENT_WEIGHT = float(os.getenv("TRENDING_COMMENT_WEIGHT", "2"))
+
+
+def current_bucket(now: Optional[float] = None) -> int:
+    """当前小时桶（Unix 时间 // 3600）"""
+    return int((time.time() if now is None else now) // 3600)
+
+
+async def record_activity(
+    session: AsyncSession,
+    preset_id: int,
+    downloads: int = 0,
+    likes: int = 0,
+    comments: int = 0,
+):
+    """在写任务中累加当前小时桶的事件数（取消点赞、删除评论传负数）"""
+    statement = dialect_insert(PresetActivity).values(
+        preset_id=preset_id,
+        bucket=current_bucket(),
+        downloads=downloads,
+        likes=likes,
+        comments=comments,
+    )
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["preset_id", "bucket"],
+            set_={
+                "downloads": PresetActivity.downloads + statement.excluded.downloads,
+                "likes": PresetActivity.likes + statement.excluded.likes,
+                "comments": PresetActivity.comments + statement.excluded.comments,
+            },
+        )
+    )
+
+
+class TrendingUpdater:
+    """定期重算 trending_score 的后台任务"""
+
+    def __init__(self, interval: float = TRENDING_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        # 上次计算后分数非零的预设；None 表示尚未运行过，首次运行时全表检查
+        self._scored: Optional[Set[int]] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                count = await self.recompute()
+                print(f"📈 热门分数已更新: {count} 个预设")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"更新热门分数失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def recompute(self, now: Optional[float] = None) -> int:
+        """重算窗口内有活动的预设分数，返回分数非零的预设数"""
+        now = time.time() if now is None else now
+        now_hours = now / 3600
+        oldest = current_bucket(now) - TRENDING_WINDOW_HOURS + 1
+
+        async def write(session: AsyncSession) -> int:
+            await session.execute(delete(PresetActivity).where(PresetActivity.bucket < oldest))
+            result = await session.execute(
+                select(
+                    PresetActivity.preset_id,
+                    PresetActivity.bucket,
+                    PresetActivity.downloads,
+                    PresetActivity.likes,
+                    PresetActivity.comments,
+                )
+            )
+            scores: Dict[int, float] = {}
+            for row in result:
+                events = (
+                    row.downloads * TRENDING_DOWNLOAD_WEIGHT
+                    + row.likes * TRENDING_LIKE_WEIGHT
+                    + row.comments * TRENDING_COMMENT_WEIGHT
+                )
+                # 以桶的中点计算距今时间
+                age = max(now_hours - (row.bucket + 0.5), 0.0)
+                decayed = events * 0.5 ** (age / TRENDING_HALF_LIFE_HOURS)
+                scores[row.preset_id] = scores.get(row.preset_id, 0.0) + decayed
+            scores = {preset_id: round(max(score, 0.0), 6) for preset_id, score in scores.items()}
+            scored = {preset_id for preset_id, score in scores.items() if score > 0}
+
+            if scores:
+                # 按主键批量更新；显式保留 updated_at，避免 onupdate 把它改成重算时间
+                await session.execute(
+                    update(Preset.__table__)
+                    .where(Preset.id == bindparam("preset_id"))
+                    .values(trending_score=bindparam("score"), updated_at=Preset.updated_at),
+                    [{"preset_id": preset_id, "score": score} for preset_id, score in scores.items()],
+                )
+
+            # 活动已移出窗口的预设分数归零
+            if self._scored is None:
+                stale = await session.execute(
+                    select(Preset.id).where(Preset.trending_score > 0)
+                )
+                expired = set(stale.scalars().all()) - scored
+            else:
+                expired = self._scored - scored
+            if expired:
+                await session.execute(
+                    update(Preset)
+                    .where(Preset.id.in_(expired))
+                    .values(trending_score=0, updated_at=Preset.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+            self._scored = scored
+            return len(scored)
+
+        return await write_queue.submit(write)
+
+
+trending_updater = TrendingUpdater()
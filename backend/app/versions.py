@@ -0,0 +1,136 @@
+"""预设版本历史
+
+第 1 版保存完整布局，之后每个版本保存相对上一版本的 JSON Patch，
+每隔 VERSION_SNAPSHOT_INTERVAL 个版本再保存一次完整快照。
+重建任意版本只需读取不晚于它的最近快照，再按顺序重放其后的补丁（一次查询）。
+
+在引入版本历史之前创建的预设没有记录，视为只有第 1 版（即当前布局）；
+首次修改布局时才补写第 1 版快照。
+"""
+import json
+import os
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Preset, PresetVersion
+from app.jsonpatch import make_patch, apply_patch, json_equal
+
+load_dotenv()
+
+VERSION_SNAPSHOT_INTERVAL = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "10"))
+
+
+def is_snapshot_version(version: int) -> bool:
+    """第 1 版及此后每 VERSION_SNAPSHOT_INTERVAL 个版本保存完整快照"""
+    return (version - 1) % VERSION_SNAPSHOT_INTERVAL == 0
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+async def latest_version(session: AsyncSession, preset_id: int) -> Optional[int]:
+    """最新版本号，没有历史记录时返回 None"""
+    result = await session.execute(
+        select(func.max(PresetVersion.version)).where(PresetVersion.preset_id == preset_id)
+    )
+    return result.scalar()
+
+
+def add_initial_version(session: AsyncSession, preset_id: int, layout_json: str):
+    """新建预设时写入第 1 版"""
+    session.add(PresetVersion(preset_id=preset_id, version=1, is_snapshot=True, data=layout_json))
+
+
+async def record_version(session: AsyncSession, preset_id: int, new_layout: dict) -> int:
+    """在写任务中、覆盖 presets.layout 之前调用，记录新布局并返回其版本号
+
+    布局没有变化时不产生新版本。
+    """
+    # 锁住预设行：PostgreSQL 下写任务并发执行，同一预设的并发修改在此排队，
+    # 避免读到相同的最新版本号后插入重复版本（SQLite 下写任务本就串行，不生成 FOR UPDATE）
+    current = await session.execute(
+        select(Preset.layout).where(Preset.id == preset_id).with_for_update()
+    )
+    old_layout = json.loads(current.scalar_one())
+
+    latest = await latest_version(session, preset_id)
+    if latest is None:
+        # 旧预设补写第 1 版
+        add_initial_version(session, preset_id, _dumps(old_layout))
+        latest = 1
+
+    if json_equal(old_layout, new_layout):
+        return latest
+
+    version = latest + 1
+    if is_snapshot_version(version):
+        data = _dumps(new_layout)
+    else:
+        data = _dumps(make_patch(old_layout, new_layout))
+    session.add(PresetVersion(
+        preset_id=preset_id,
+        version=version,
+        is_snapshot=is_snapshot_version(version),
+        data=data,
+    ))
+    return version
+
+
+async def load_version(session: AsyncSession, preset: Preset, version: int) -> Optional[dict]:
+    """重建指定版本的布局，版本不存在时返回 None"""
+    snapshot = (
+        select(func.max(PresetVersion.version))
+        .where(
+            PresetVersion.preset_id == preset.id,
+            PresetVersion.is_snapshot == True,
+            PresetVersion.version <= version,
+        )
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(PresetVersion.version, PresetVersion.data)
+        .where(
+            PresetVersion.preset_id == preset.id,
+            PresetVersion.version >= snapshot,
+            PresetVersion.version <= version,
+        )
+        .order_by(PresetVersion.version)
+    )
+    rows = result.all()
+    if not rows:
+        # 有历史记录时第 1 版必然存在，查不到说明是没有历史记录的旧预设
+        return json.loads(preset.layout) if version == 1 else None
+    if rows[-1].version != version:
+        return None
+
+    layout = json.loads(rows[0].data)
+    for row in rows[1:]:
+        layout = apply_patch(layout, json.loads(row.data))
+    return layout
+
+
+async def list_versions(session: AsyncSession, preset_id: int) -> List[dict]:
+    """版本列表（新版本在前），不读取版本内容"""
+    result = await session.execute(
+        select(
+            PresetVersion.version,
+            PresetVersion.is_snapshot,
+            func.length(PresetVersion.data).label("size"),
+            PresetVersion.created_at,
+        )
+        .where(PresetVersion.preset_id == preset_id)
+        .order_by(PresetVersion.version.desc())
+    )
+    return [
+        {
+            "version": row.version,
+            "is_snapshot": row.is_snapshot,
+            "size": row.size,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+        }
+        for row in result
+    ]
@@ -0,0 +1,231 @@
+"""市场 API 负载基准
+
+在临时 SQLite 数据库中生成数据，通过 ASGI transport 在进程内并发请求各接口，
+统计每个接口的吞吐与 p50/p95/p99 延迟，可保存为 JSON 基线并与基线对比。
+
+用法（在 backend 目录下）：
+
+    python -m benchmarks.api                                   # 运行并打印结果
+    python -m benchmarks.api --save-baseline benchmarks/baseline.json
+    python -m benchmarks.api --baseline benchmarks/baseline.json --threshold 0.2
+
+对比基线时，任一接口 p95 变慢或吞吐下降超过 threshold（默认 20%）即以退出码 1 结束。
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ENDPOINTS = [
+    "list_presets",
+    "get_preset",
+    "download_preset",
+    "toggle_like",
+    "get_comments",
+    "create_preset",
+    "suggest",
+    "similar",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+async def drive(make_request: Callable, requests: int, concurrency: int) -> dict:
+    """以 concurrency 个并发客户端共发出 requests 个请求"""
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for i in remaining:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.database import init_db, close_db, write_engine
+    from app.auth import create_access_token
+    from benchmarks.seed import SeedConfig, seed_database, make_layout
+
+    await init_db()
+    config = SeedConfig(
+        users=args.users,
+        presets=args.presets,
+        likes=args.likes,
+        comments=args.comments,
+        layout_kb=args.layout_kb,
+        seed=args.seed,
+    )
+    seeded = await seed_database(write_engine, config)
+    rng = random.Random(args.seed)
+    tokens = {
+        user_id: {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+        for user_id in seeded.user_ids
+    }
+    sorts = ["latest", "popular", "likes", "trending"]
+    prefixes = ["b", "bench-preset-1", "基准", "jz", "夜", "yj", "cyber", "re"]
+
+    def preset_id() -> int:
+        return rng.choice(seeded.public_preset_ids)
+
+    def auth() -> dict:
+        return tokens[rng.choice(seeded.user_ids)]
+
+    results: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        scenarios = {
+            "list_presets": lambda i: client.get(
+                "/api/presets",
+                params={"sort": sorts[i % len(sorts)], "page": rng.randint(1, 5), "page_size": 20},
+            ),
+            "get_preset": lambda i: client.get(f"/api/presets/{preset_id()}", headers=auth()),
+            "download_preset": lambda i: client.get(f"/api/presets/{preset_id()}/download"),
+            "toggle_like": lambda i: client.post(f"/api/presets/{preset_id()}/like", headers=auth()),
+            "get_comments": lambda i: client.get(f"/api/comments/preset/{preset_id()}"),
+            "create_preset": lambda i: client.post(
+                "/api/presets",
+                json={"name": f"bench new {i}", "layout": make_layout(rng, args.layout_kb)},
+                headers=auth(),
+            ),
+            "suggest": lambda i: client.get(
+                "/api/presets/suggest", params={"q": prefixes[i % len(prefixes)]}
+            ),
+            "similar": lambda i: client.get(f"/api/presets/{preset_id()}/similar"),
+        }
+        for name in args.endpoints:
+            # 预热，排除首次导入与缓存建立的开销
+            for i in range(min(5, args.requests)):
+                await scenarios[name](i)
+            results[name] = await drive(scenarios[name], args.requests, args.concurrency)
+            print(f"  {name}: {results[name]['throughput']} req/s", file=sys.stderr)
+
+    await close_db()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(config).items()},
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """返回超过阈值的回归项"""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        if base["p95_ms"] > 0 and now["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {now['p95_ms']}ms")
+        if base["throughput"] > 0 and now["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐 {base['throughput']} -> {now['throughput']} req/s")
+    return regressions
+
+
+def print_table(report: dict):
+    print(f"{'接口':<18}{'请求':>8}{'错误':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in report["results"].items():
+        print(
+            f"{name:<18}{r['requests']:>8}{r['errors']:>6}{r['throughput']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="市场 API 负载基准")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--presets", type=int, default=2000)
+    parser.add_argument("--likes", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--layout-kb", type=int, default=8, help="每个预设布局 JSON 的大致大小")
+    parser.add_argument("--requests", type=int, default=500, help="每个接口的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--db", help="新建的 SQLite 数据库文件路径，运行后保留（默认使用临时文件）")
+    parser.add_argument("--save-baseline", help="将结果保存为 JSON 基线")
+    parser.add_argument("--baseline", help="与该 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回归比例")
+    args = parser.parse_args()
+
+    if args.db:
+        # 基准会写入大量数据，只接受不存在的路径，避免误用正式数据库
+        existing = [
+            path for path in (Path(args.db), Path(f"{args.db}-wal"), Path(f"{args.db}-shm"))
+            if path.exists()
+        ]
+        if existing:
+            parser.error(f"{existing[0]} 已存在，请指定一个新的数据库路径")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(args.db) if args.db else Path(tmp) / "bench.db"
+        # 必须在导入 app 之前设置
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+        os.environ["UPLOAD_DIR"] = str(Path(tmp) / "uploads")
+        os.environ["PLUGIN_DATA_DIR"] = ""
+        # 并发压测下排队时间会计入语句耗时，默认关闭慢查询日志
+        os.environ.setdefault("SLOW_QUERY_MS", "60000")
+        # 压测流量来自同一 IP，关闭准入控制以测量接口本身的容量
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        report = asyncio.run(run_benchmark(args))
+
+    print_table(report)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("❌ 性能回归：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✅ 未发现超过阈值的回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""SQLite 配置基准：并发写负载下的读吞吐
+
+用法（在 backend 目录下）：
+
+    python -m benchmarks.sqlite_profile --duration 10 --readers 4 --writers 40
+
+分别以 SQLITE_PROFILE=false（默认回滚日志、无写队列）和 SQLITE_PROFILE=true
+（WAL + pragma + 串行写队列）在子进程中运行同一负载，输出两者的读写吞吐、读延迟与失败次数。
+写协程与接口处理函数一样先经 get_db 查询用户，持有读会话时提交写任务。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+async def run_workload(args) -> dict:
+    """子进程内执行：读协程持续分页查询，写协程持续点赞/下载计数"""
+    from sqlalchemy import select, update, desc, delete
+    from app.database import AsyncSessionLocal, write_queue, init_db, close_db, get_db
+    from app.models import User, Preset, Like
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        users = [User(github_id=i, username=f"user{i}") for i in range(args.users)]
+        session.add_all(users)
+        await session.flush()
+        session.add_all([
+            Preset(
+                name=f"preset {i}",
+                slug=f"preset-{i}",
+                layout=json.dumps({"canvas_width": 1600, "canvas_height": 600, "blocks": ["x" * 64] * 40}),
+                author_id=users[i % len(users)].id,
+                download_count=0,
+                like_count=0,
+                comment_count=0,
+            )
+            for i in range(args.presets)
+        ])
+        await session.commit()
+        preset_ids = list((await session.execute(select(Preset.id))).scalars().all())
+        user_ids = [u.id for u in users]
+
+    deadline = time.perf_counter() + args.duration
+    stats = {"reads": 0, "writes": 0, "write_errors": 0, "read_errors": 0}
+    read_latencies = []
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async for session in get_db():
+                    result = await session.execute(
+                        select(Preset).order_by(desc(Preset.created_at)).limit(20)
+                    )
+                    result.scalars().all()
+                stats["reads"] += 1
+                read_latencies.append(time.perf_counter() - started)
+            except Exception:
+                stats["read_errors"] += 1
+
+    async def writer():
+        while time.perf_counter() < deadline:
+            preset_id = random.choice(preset_ids)
+            user_id = random.choice(user_ids)
+
+            async def write(session):
+                await session.execute(
+                    update(Preset)
+                    .where(Preset.id == preset_id)
+                    .values(download_count=Preset.download_count + 1)
+                )
+                result = await session.execute(
+                    delete(Like).where(Like.preset_id == preset_id, Like.user_id == user_id)
+                )
+                if result.rowcount == 0:
+                    session.add(Like(preset_id=preset_id, user_id=user_id))
+
+            try:
+                # 与 get_current_user 相同：先在请求的读会话中查询用户，再排队写入
+                async for session in get_db():
+                    await session.execute(select(User).where(User.id == user_id))
+                    await write_queue.submit(write)
+                stats["writes"] += 1
+            except Exception:
+                stats["write_errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[reader() for _ in range(args.readers)],
+        *[writer() for _ in range(args.writers)],
+    )
+    elapsed = time.perf_counter() - started
+    await close_db()
+    read_latencies.sort()
+
+    def percentile(p: float) -> float:
+        if not read_latencies:
+            return 0.0
+        return round(read_latencies[min(int(len(read_latencies) * p), len(read_latencies) - 1)] * 1000, 1)
+
+    return {
+        "reads_per_sec": round(stats["reads"] / elapsed, 1),
+        "writes_per_sec": round(stats["writes"] / elapsed, 1),
+        "read_p50_ms": percentile(0.5),
+        "read_p95_ms": percentile(0.95),
+        "read_errors": stats["read_errors"],
+        "write_errors": stats["write_errors"],
+    }
+
+
+def run_profile(enabled: bool, args) -> dict:
+    """在独立子进程中按指定配置运行负载"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        env["SQLITE_PROFILE"] = "true" if enabled else "false"
+        env["SQLITE_BUSY_TIMEOUT"] = str(args.busy_timeout)
+        cmd = [
+            sys.executable, "-m", "benchmarks.sqlite_profile", "--child",
+            "--duration", str(args.duration),
+            "--readers", str(args.readers),
+            "--writers", str(args.writers),
+            "--users", str(args.users),
+            "--presets", str(args.presets),
+        ]
+        output = subprocess.run(
+            cmd, cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 配置读写吞吐基准")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种配置运行秒数")
+    parser.add_argument("--readers", type=int, default=8, help="并发读协程数")
+    parser.add_argument("--writers", type=int, default=40, help="并发写协程数")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--presets", type=int, default=500)
+    parser.add_argument("--busy-timeout", type=int, default=5000, help="SQLITE_BUSY_TIMEOUT（毫秒）")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_workload(args))))
+        return
+
+    results = {
+        "default": run_profile(False, args),
+        "profile": run_profile(True, args),
+    }
+    print(
+        f"{'配置':<10}{'读/秒':>12}{'写/秒':>12}{'读 p50 ms':>12}{'读 p95 ms':>12}"
+        f"{'读失败':>10}{'写失败':>10}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<10}{r['reads_per_sec']:>12}{r['writes_per_sec']:>12}"
+            f"{r['read_p50_ms']:>12}{r['read_p95_ms']:>12}"
+            f"{r['read_errors']:>10}{r['write_errors']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
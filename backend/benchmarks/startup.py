@@ -0,0 +1,106 @@
+"""启动耗时基准：应用导入耗时与首个响应时间
+
+用法（在 backend 目录下）：
+
+    python -m benchmarks.startup --runs 5
+
+- import：全新解释器中 `import app.main` 的耗时
+- first response（空库）：启动 uvicorn 到 /health 首次返回 200 的时间，包含执行全部迁移
+- first response（已有库）：同一数据库再次启动，只做 schema 版本检查
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = (
+    "import time, json, sys;"
+    "start = time.perf_counter();"
+    "import app.main;"
+    "elapsed = time.perf_counter() - start;"
+    "heavy = [m for m in ('PIL.Image', 'jose.jwt', 'httpx', 'numpy') if m in sys.modules];"
+    "print(json.dumps({'import_ms': elapsed * 1000, 'heavy_modules': heavy}))"
+)
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_response(env: dict, timeout: float = 30.0) -> float:
+    """启动 uvicorn，轮询 /health 直到返回 200，返回耗时（毫秒）"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("服务未在超时时间内响应")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量次数，取中位数")
+    args = parser.parse_args()
+
+    imports, cold, warm = [], [], []
+    heavy = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["UPLOAD_DIR"] = str(Path(tmp) / "uploads")
+        env["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp) / 'import.db'}"
+        for _ in range(args.runs):
+            result = measure_import(env)
+            imports.append(result["import_ms"])
+            heavy.update(result["heavy_modules"])
+
+        for i in range(args.runs):
+            db_path = Path(tmp) / f"startup-{i}.db"
+            env["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+            cold.append(measure_first_response(env))
+            warm.append(measure_first_response(env))
+
+    print(f"{'项目':<24}{'中位数 ms':>12}{'最小 ms':>12}")
+    for name, values in (
+        ("import app.main", imports),
+        ("first response（空库）", cold),
+        ("first response（已有库）", warm),
+    ):
+        print(f"{name:<24}{statistics.median(values):>12.1f}{min(values):>12.1f}")
+    if heavy:
+        print(f"⚠️  导入时加载了重型依赖: {', '.join(sorted(heavy))}")
+
+
+if __name__ == "__main__":
+    main()
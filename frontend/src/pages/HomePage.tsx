@@ -26,6 +26,8 @@ export default function HomePage() {
   const [loading, setLoading] = useState(true)
   const [sort, setSort] = useState('latest')
   const [search, setSearch] = useState('')
+  // 输入停顿后再请求，避免每次按键都查询一次
+  const [debouncedSearch, setDebouncedSearch] = useState('')
   const [page, setPage] = useState(1)
   const [total, setTotal] = useState(0)
   const { token, isAuthenticated } = useAuth()
@@ -34,7 +36,7 @@ export default function HomePage() {
     setLoading(true)
     try {
       const response = await axios.get('/api/presets', {
-        params: { page, sort, search: search || undefined },
+        params: { page, sort, search: debouncedSearch || undefined },
         headers: token ? { Authorization: `Bearer ${token}` } : {},
       })
       setPresets(response.data.items)
@@ -46,9 +48,14 @@ export default function HomePage() {
     }
   }
 
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedSearch(search.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [search])
+
   useEffect(() => {
     fetchPresets()
-  }, [page, sort, search])
+  }, [page, sort, debouncedSearch])
 
   const handleLike = async (presetId: number) => {
     if (!isAuthenticated) {
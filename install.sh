@@ -353,7 +353,7 @@ JWT_SECRET_KEY=$JWT_SECRET
 JWT_ALGORITHM=HS256
 
 # Database
-DATABASE_URL=sqlite+aiosqlite:///./preset_market.db
+DATABASE_URL=sqlite+aiosqlite:////app/data/preset_market.db
 
 # Server
 HOST=0.0.0.0